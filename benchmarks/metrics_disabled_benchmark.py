@@ -0,0 +1,78 @@
+# Measures the per-request cost of the metrics instrumentation when metrics and metrics log are disabled.
+# The eager block is how the instrumentation used to run: tags and messages are built before the
+# collector finds out that nothing is reported.
+# usage: python benchmarks/metrics_disabled_benchmark.py [call_count]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from byteplus_rec_core import constant, utils  # noqa: E402
+from byteplus_rec_core.metrics.metrics import Metrics  # noqa: E402
+from byteplus_rec_core.metrics.metrics_log import MetricsLog  # noqa: E402
+
+_PROJECT_ID = "benchmark"
+_URL = "https://rec-api-sg1.recplusapi.com/predict/api/retail/benchmark/recommend?scene=home"
+_HEADERS = {"Content-Type": "application/json", "Request-Id": "x" * 36, "Tenant-Id": "benchmark",
+            "Server-Timing": "inner;dur=17", "Content-Encoding": "gzip"}
+_BODY = b'{"status": {"code": 0}, "value": "' + b"x" * 2048 + b'"}'
+
+
+def _eager(cost: int):
+    metrics_tags = [
+        "project_id:" + _PROJECT_ID,
+        "url:" + utils.escape_metrics_tag_value(_URL),
+    ]
+    Metrics.timer(constant.METRICS_KEY_REQUEST_TOTAL_COST, cost, *metrics_tags)
+    Metrics.counter(constant.METRICS_KEY_REQUEST_COUNT, 1, *metrics_tags)
+    message = "[ByteplusSDK] http request, project_id:{}, url:{}, cost:{}ms".format(_PROJECT_ID, _URL, cost)
+    if MetricsLog.is_enabled():
+        MetricsLog.info("benchmark", message)
+
+
+def _guarded(cost: int):
+    if Metrics.is_enabled():
+        metrics_tags = [
+            "project_id:" + _PROJECT_ID,
+            "url:" + utils.escape_metrics_tag_value(_URL),
+        ]
+        Metrics.timer(constant.METRICS_KEY_REQUEST_TOTAL_COST, cost, *metrics_tags)
+        Metrics.counter(constant.METRICS_KEY_REQUEST_COUNT, 1, *metrics_tags)
+    if MetricsLog.is_enabled():
+        MetricsLog.info("benchmark", "[ByteplusSDK] http request, project_id:{}, url:{}, cost:{}ms",
+                        _PROJECT_ID, _URL, cost)
+
+
+def _eager_error_log(cost: int):
+    MetricsLog.error("benchmark", "[ByteplusSDK] http status not 200, url:{}, headers:\n{}, body:\n{}",
+                     _URL, str(_HEADERS), str(_BODY))
+
+
+def _lazy_error_log(cost: int):
+    MetricsLog.error("benchmark", "[ByteplusSDK] http status not 200, url:{}, headers:\n{}, body:\n{}",
+                     _URL, _HEADERS, _BODY)
+
+
+def _bench(name: str, call, count: int) -> float:
+    start = time.perf_counter()
+    for i in range(count):
+        call(i)
+    ns = (time.perf_counter() - start) * 1e9 / count
+    print("{:<20} {:8.1f}ns/call".format(name, ns))
+    return ns
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    assert not Metrics.is_enabled() and not MetricsLog.is_enabled()
+    baseline = _bench("empty", lambda i: None, count)
+    _bench("eager request", _eager, count)
+    guarded = _bench("guarded request", _guarded, count)
+    _bench("eager error log", _eager_error_log, count)
+    _bench("lazy error log", _lazy_error_log, count)
+    print("disabled instrumentation cost/request: {:.1f}ns".format(guarded - baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Compares the client CPU cost per request of the transports of the blocking HTTPClient.
+# The server runs in another process, so only the CPU time of the client process is measured.
+# usage: python benchmarks/transport_benchmark.py [request_count]
+import gzip
+import multiprocessing
+import os
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from byteplus_rec_core.transport import RequestsTransport, Urllib3Transport  # noqa: E402
+
+_RSP_BODY: bytes = gzip.compress(b'{"status": {"code": 0}, "value": "' + b"x" * 512 + b'"}')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(_RSP_BODY)))
+        self.end_headers()
+        self.wfile.write(_RSP_BODY)
+
+
+def _serve(port_queue):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def _bench(name: str, transport, url: str, count: int):
+    headers = {
+        "Content-Type": "application/json",
+        "Content-Encoding": "gzip",
+        "Accept-Encoding": "gzip",
+        "Request-Id": "benchmark",
+        "Tenant-Id": "benchmark",
+    }
+    body = gzip.compress(b'{"user": "benchmark", "items": [1, 2, 3]}')
+    for _ in range(100):
+        transport.post(url, headers, body, 1)
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(count):
+        rsp = transport.post(url, headers, body, 1)
+        assert rsp.status_code == 200 and len(rsp.content) > 0
+    cpu_us = (time.process_time() - cpu_start) * 1e6 / count
+    wall_us = (time.perf_counter() - wall_start) * 1e6 / count
+    print("{:<20} cpu/request: {:8.1f}us  wall/request: {:8.1f}us".format(name, cpu_us, wall_us))
+    return cpu_us
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, args=(port_queue,), daemon=True)
+    server.start()
+    url = "http://127.0.0.1:{}/predict/api/test".format(port_queue.get())
+    try:
+        requests_cpu = _bench("RequestsTransport", RequestsTransport(8), url, count)
+        urllib3_cpu = _bench("Urllib3Transport", Urllib3Transport(8), url, count)
+        print("saved cpu/request: {:.1f}us ({:.0%})".format(requests_cpu - urllib3_cpu,
+                                                           1 - urllib3_cpu / requests_cpu))
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
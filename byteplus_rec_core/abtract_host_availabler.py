@@ -1,16 +1,20 @@
 import copy
+import itertools
 import json
 import uuid
 from abc import abstractmethod
+from concurrent.futures import Future, InvalidStateError
 import logging
 import threading
 import time
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 import requests
 from requests import Response
 
 from byteplus_rec_core import utils
+from byteplus_rec_core.circuit_breaker import CircuitBreakerConfig, _CircuitBreaker
 from byteplus_rec_core.exception import BizException
+from byteplus_rec_core.host_selector import HostSelector, FirstHostSelector
 from byteplus_rec_core import constant
 from byteplus_rec_core.metrics.metrics import Metrics
 from byteplus_rec_core.metrics.metrics_log import MetricsLog
@@ -21,6 +25,22 @@ _FETCH_HOST_URL_FORMAT: str = "http://{}/data/api/sdk/host?project_id={}"
 _HOST_AVAILABLE_SCORE_FORMAT: str = "host={}, score={}"
 _DEFAULT_SCORE_HOST_INTERVAL_SECONDS: float = 1
 _MAIN_HOST_AVAILABLE_SCORE: float = 0.9
+# weight of the newest request in the error rate EWMA of a host
+_REQUEST_ERROR_EWMA_ALPHA: float = 0.3
+# the error rate of a host halves every half life without new requests,
+# so a host which receives no more traffic can win traffic back
+_REQUEST_ERROR_HALF_LIFE_SECONDS: float = 10
+# number of recent request latencies kept for each host
+_REQUEST_LATENCY_WINDOW_SIZE: int = 100
+_REQUEST_LATENCY_PERCENTILE: float = 0.9
+# latency percentiles are not trusted until this number of samples is collected
+_REQUEST_LATENCY_MIN_SAMPLES: int = 10
+# a host is not penalized until its latency percentile exceeds the best one by this ratio
+_REQUEST_LATENCY_TOLERANCE_RATIO: float = 1.5
+# minimal interval of re-ranking hosts triggered by failed requests
+_RERANK_MIN_INTERVAL_SECONDS: float = 0.1
+# used as network round trip time of a host until it is measured by pings
+_DEFAULT_RTT_MILLIS: float = 20
 
 
 class HostAvailabilityScore:
@@ -43,6 +63,63 @@ class HostScoreResult:
         return '[{}]'.format(','.join(host_score_str_list))
 
 
+class _HostRequestStat(object):
+    # Statistics of real requests sent to one host. Updated by request threads without a lock,
+    # a lost update under contention only makes the statistics slightly less accurate.
+    def __init__(self):
+        self.error_rate: float = 0.0
+        self.last_update_time: float = time.time()
+        self.latency_ewma: float = 0.0
+        # round trip time measured by successful pings
+        self.rtt_ewma: float = 0.0
+        self.latency_window: utils._LatencyWindow = utils._LatencyWindow(_REQUEST_LATENCY_WINDOW_SIZE)
+        # next() of itertools.count is atomic, in-flight = started - finished never drifts,
+        # a racing store only makes it stale until the next request
+        self._started_counter = itertools.count(1)
+        self._finished_counter = itertools.count(1)
+        self.started_count: int = 0
+        self.finished_count: int = 0
+
+    def start(self):
+        self.started_count = next(self._started_counter)
+
+    def in_flight(self) -> int:
+        return max(0, self.started_count - self.finished_count)
+
+    def finish(self):
+        self.finished_count = next(self._finished_counter)
+
+    def put(self, success: bool, cost_ms: int):
+        self.finish()
+        now = time.time()
+        error_rate = self._decayed_error_rate(now)
+        self.error_rate = error_rate + _REQUEST_ERROR_EWMA_ALPHA * ((0.0 if success else 1.0) - error_rate)
+        self.last_update_time = now
+        if self.latency_ewma == 0:
+            self.latency_ewma = float(cost_ms)
+        else:
+            self.latency_ewma = self.latency_ewma + _REQUEST_ERROR_EWMA_ALPHA * (cost_ms - self.latency_ewma)
+        self.latency_window.put(cost_ms)
+
+    def put_rtt(self, cost_ms: int):
+        if self.rtt_ewma == 0:
+            self.rtt_ewma = float(cost_ms)
+            return
+        self.rtt_ewma = self.rtt_ewma + _REQUEST_ERROR_EWMA_ALPHA * (cost_ms - self.rtt_ewma)
+
+    def _decayed_error_rate(self, now: float) -> float:
+        elapsed = now - self.last_update_time
+        if elapsed <= 0:
+            return self.error_rate
+        return self.error_rate * 0.5 ** (elapsed / _REQUEST_ERROR_HALF_LIFE_SECONDS)
+
+    def current_error_rate(self) -> float:
+        return self._decayed_error_rate(time.time())
+
+    def latency_percentile(self) -> Optional[int]:
+        return self.latency_window.percentile(_REQUEST_LATENCY_PERCENTILE, _REQUEST_LATENCY_MIN_SAMPLES)
+
+
 # class AvailablerConfig(object):
 #     def __init__(self, default_hosts: Optional[List[str]] = None,
 #                  project_id: Optional[str] = None,
@@ -56,18 +133,40 @@ class AbstractHostAvailabler(object):
     def __init__(self, default_hosts: Optional[List[str]] = None,
                  project_id: Optional[str] = None,
                  main_host: Optional[str] = None,
-                 score_host_interval_seconds: Optional[float] = _DEFAULT_SCORE_HOST_INTERVAL_SECONDS):
+                 score_host_interval_seconds: Optional[float] = _DEFAULT_SCORE_HOST_INTERVAL_SECONDS,
+                 blocking_init: bool = True):
         self.project_id = project_id
         self._default_hosts = default_hosts
         self._main_host = main_host
         self._host_config = None
         self._score_host_interval_seconds = score_host_interval_seconds
         self._cancel = None
+        # the latest scores given by do_score_hosts, combined with request statistics when ranking hosts
+        self._host_scores: Dict[str, float] = {}
+        self._request_stats: Dict[str, _HostRequestStat] = {}
+        self._update_lock = threading.Lock()
+        # set when a rerank finds the lock held by a scoring round, which then reranks when it releases the lock
+        self._rerank_pending: bool = False
+        self._last_rerank_time: float = 0
+        self._host_selector: HostSelector = FirstHostSelector()
+        # path -> selection prepared by the host selector, replaced as a whole when hosts are ranked
+        self._host_selections: Dict[str, object] = {}
+        self._circuit_breaker_config: Optional[CircuitBreakerConfig] = None
+        self._circuit_breakers: Dict[str, _CircuitBreaker] = {}
+        # If blocking_init is False, the constructor never scores hosts,
+        # the first scoring round runs in the background at once.
+        self._blocking_init = blocking_init
+        # done when the first scoring round finishes
+        self._ready_future: Future = Future()
         self.init()
 
     def init(self):
-        self.set_hosts(self._default_hosts)
-        self._cancel = utils.time_schedule(self._start_score_and_update_hosts, self._score_host_interval_seconds)
+        if self._blocking_init:
+            self.set_hosts(self._default_hosts)
+        else:
+            self._set_static_hosts(self._default_hosts)
+        self._cancel = utils.time_schedule(self._start_score_and_update_hosts, self._score_host_interval_seconds,
+                                           "score_hosts")
 
     def set_hosts(self, hosts: List[str]):
         if hosts is None or len(hosts) == 0:
@@ -75,14 +174,62 @@ class AbstractHostAvailabler(object):
         self._default_hosts = hosts
         self._score_and_update_hosts({"*": hosts})
 
+    def _set_static_hosts(self, hosts: List[str]):
+        # Use the configured host order until the first scoring round finishes,
+        # main_host is moved to the front if it is one of the hosts.
+        if hosts is None or len(hosts) == 0:
+            raise BizException("host array is empty")
+        self._default_hosts = hosts
+        ordered_hosts: List[str] = list(hosts)
+        if self._main_host is not None and self._main_host in ordered_hosts:
+            ordered_hosts.remove(self._main_host)
+            ordered_hosts.insert(0, self._main_host)
+        self._host_config = {"*": ordered_hosts}
+        initial_host_scores: Optional[List[HostAvailabilityScore]] = self._initial_host_scores(ordered_hosts)
+        if initial_host_scores is None or len(initial_host_scores) == 0:
+            return
+        with self._update_lock:
+            self._host_scores = {host_score.host: host_score.score for host_score in initial_host_scores}
+            self._sort_and_set_hosts("init_" + str(uuid.uuid1()), self._host_config)
+        self._run_pending_rerank()
+
+    # Scores known before the first scoring round, such as restored from a snapshot,
+    # None to keep the configured host order.
+    def _initial_host_scores(self, hosts: List[str]) -> Optional[List[HostAvailabilityScore]]:
+        return None
+
     def _start_score_and_update_hosts(self):
         self._score_and_update_hosts(self._host_config)
         return
 
     def _score_and_update_hosts(self, host_config: Dict[str, List[str]]):
+        try:
+            hosts: List[str] = self._distinct_hosts(host_config)
+            new_host_scores: List[HostAvailabilityScore] = self.do_score_hosts(hosts)
+            self._update_hosts(host_config, new_host_scores)
+        finally:
+            self._mark_ready()
+
+    def _mark_ready(self):
+        if self._ready_future.done():
+            return
+        try:
+            self._ready_future.set_result(None)
+        except InvalidStateError:
+            # set by a concurrent scoring round
+            pass
+
+    # A future which is done when hosts are ranked by the first scoring round.
+    def ready(self) -> Future:
+        return self._ready_future
+
+    def _update_hosts(self, host_config: Dict[str, List[str]], new_host_scores: List[HostAvailabilityScore]):
+        with self._update_lock:
+            self._do_update_hosts(host_config, new_host_scores)
+        self._run_pending_rerank()
+
+    def _do_update_hosts(self, host_config: Dict[str, List[str]], new_host_scores: List[HostAvailabilityScore]):
         log_id: str = "score_" + str(uuid.uuid1())
-        hosts: List[str] = self._distinct_hosts(host_config)
-        new_host_scores: List[HostAvailabilityScore] = self.do_score_hosts(hosts)
         MetricsLog.info(log_id, "[ByteplusSDK][Score] score hosts: project_id: {}, result:{}",
                         self.project_id, HostScoreResult(new_host_scores))
         log.debug("[ByteplusSDK] score hosts result: '%s'", HostScoreResult(new_host_scores))
@@ -96,7 +243,13 @@ class AbstractHostAvailabler(object):
                              self.project_id)
             log.error("[ByteplusSDK] scoring hosts return an empty list")
             return
+        self._host_scores = {host_score.host: host_score.score for host_score in new_host_scores}
+        self._sort_and_set_hosts(log_id, host_config)
+
+    def _sort_and_set_hosts(self, log_id: str, host_config: Dict[str, List[str]]):
+        new_host_scores: List[HostAvailabilityScore] = self._combine_request_stats(self._host_scores)
         new_host_config: Dict[str, List[str]] = self._copy_and_sort_host(host_config, new_host_scores)
+        self._prepare_host_selections(new_host_config, new_host_scores)
         if self._is_host_config_not_update(self._host_config, new_host_config):
             MetricsLog.info(log_id, "[ByteplusSDK][Score] host order is not changed, project_id: {}, config:{}",
                             self.project_id, new_host_config)
@@ -113,6 +266,173 @@ class AbstractHostAvailabler(object):
                     self._host_config)
         self._host_config = new_host_config
 
+    def set_host_selector(self, host_selector: HostSelector):
+        self._host_selector = host_selector
+        self._host_selections = {}
+        self._rerank_hosts()
+
+    # Hosts whose circuit breaker is not closed are dropped from get_host and get_backup_host,
+    # requests fall back to all the hosts if the breakers of all hosts are open.
+    def set_circuit_breaker_config(self, config: CircuitBreakerConfig):
+        self._circuit_breaker_config = config
+        self._circuit_breakers = {}
+
+    def _prepare_host_selections(self, host_config: Dict[str, List[str]],
+                                 host_scores: List[HostAvailabilityScore]):
+        # scores of host_scores were raised by _copy_and_sort_host if main_host is prioritized
+        host_score_index = {host_score.host: host_score.score for host_score in host_scores}
+        selections: Dict[str, object] = {}
+        for path in host_config:
+            hosts: List[str] = self._filter_allowed_hosts(host_config[path])
+            if len(hosts) == 0:
+                continue
+            scores = [host_score_index.get(host, 0.0) for host in hosts]
+            if self._main_host is not None and hosts[0] == self._main_host and scores[0] > 1:
+                hosts = hosts[:1]
+                scores = scores[:1]
+            selections[path] = self._host_selector.prepare(hosts, scores, self._request_stats)
+        self._host_selections = selections
+
+    def _combine_request_stats(self, host_scores: Dict[str, float]) -> List[HostAvailabilityScore]:
+        # score = score of do_score_hosts * (1 - request error rate) * latency factor,
+        # the latency factor punishes hosts much slower than the fastest one.
+        latencies: Dict[str, int] = {}
+        for host in host_scores:
+            stat = self._request_stats.get(host)
+            if stat is None:
+                continue
+            latency = stat.latency_percentile()
+            if latency is not None:
+                latencies[host] = latency
+        best_latency = min(latencies.values()) if len(latencies) > 0 else None
+        combined_scores: List[HostAvailabilityScore] = []
+        for host, score in host_scores.items():
+            stat = self._request_stats.get(host)
+            if stat is not None:
+                score = score * (1 - stat.current_error_rate())
+            latency = latencies.get(host)
+            if latency is not None and latency > max(best_latency, 1) * _REQUEST_LATENCY_TOLERANCE_RATIO:
+                score = score * max(best_latency, 1) / latency
+            combined_scores.append(HostAvailabilityScore(host, score))
+        return combined_scores
+
+    def _is_host_allowed(self, host: str) -> bool:
+        breaker = self._circuit_breakers.get(host)
+        return breaker is None or breaker.is_closed()
+
+    def _filter_allowed_hosts(self, hosts: List[str]) -> List[str]:
+        if len(self._circuit_breakers) == 0:
+            return hosts
+        allowed_hosts = [host for host in hosts if self._is_host_allowed(host)]
+        if len(allowed_hosts) == 0:
+            return hosts
+        return allowed_hosts
+
+    def _get_circuit_breaker(self, host: str) -> Optional[_CircuitBreaker]:
+        if self._circuit_breaker_config is None:
+            return None
+        breaker = self._circuit_breakers.get(host)
+        if breaker is None:
+            breaker = self._circuit_breakers.setdefault(host, _CircuitBreaker(self._circuit_breaker_config))
+        return breaker
+
+    # Called with the result of each ping, it probes the hosts whose circuit breaker is open.
+    def report_probe_result(self, host: str, success: bool):
+        breaker = self._get_circuit_breaker(host)
+        if breaker is None:
+            return
+        self._on_circuit_transitions(host, breaker.on_probe_result(success))
+
+    def _on_circuit_transitions(self, host: str, transitions: List[Tuple[str, str]]) -> bool:
+        if len(transitions) == 0:
+            return False
+        log_id: str = "circuit_" + str(uuid.uuid1())
+        for old_state, new_state in transitions:
+            metrics_tags = [
+                "from:" + old_state,
+                "to:" + new_state,
+                "project_id:" + self.project_id,
+                "host:" + utils.escape_metrics_tag_value(host),
+            ]
+            Metrics.counter(constant.METRICS_KEY_CIRCUIT_BREAKER_TRANSITION, 1, *metrics_tags)
+            MetricsLog.warn(log_id, "[ByteplusSDK] circuit breaker of host changes from {} to {}, "
+                                    "project_id:{}, host:{}", old_state, new_state, self.project_id, host)
+            log.warning("[ByteplusSDK] circuit breaker of host '%s' changes from %s to %s",
+                        host, old_state, new_state)
+        # the host is dropped from or added back to get_host at once
+        self._rerank_hosts()
+        return True
+
+    def _get_request_stat(self, host: str) -> _HostRequestStat:
+        stat = self._request_stats.get(host)
+        if stat is None:
+            stat = self._request_stats.setdefault(host, _HostRequestStat())
+        return stat
+
+    # Called before each real request, it tracks the in-flight requests of the host.
+    def report_request_start(self, host: str):
+        self._get_request_stat(host).start()
+
+    # Called after each real request, so that hosts are also ranked by the outcome and latency of real traffic.
+    def report_request_result(self, host: str, success: bool, cost_ms: int):
+        self._get_request_stat(host).put(success, cost_ms)
+        breaker = self._get_circuit_breaker(host)
+        sent_time = time.time() - cost_ms / 1000
+        if breaker is not None and self._on_circuit_transitions(host, breaker.on_request_result(success, sent_time)):
+            return
+        if success or not self._is_first_host(host):
+            return
+        # move traffic off a failing host now rather than at the next scoring round
+        now = time.time()
+        if now - self._last_rerank_time < _RERANK_MIN_INTERVAL_SECONDS:
+            return
+        self._last_rerank_time = now
+        self._rerank_hosts()
+
+    # Called instead of report_request_result when the request is cancelled by the caller,
+    # such as the losing hedged request, the outcome says nothing about the host.
+    def report_request_cancel(self, host: str):
+        self._get_request_stat(host).finish()
+
+    # Called with the cost of each successful ping, it estimates the network round trip time of the host.
+    def report_ping_rtt(self, host: str, cost_ms: int):
+        self._get_request_stat(host).put_rtt(cost_ms)
+
+    def get_rtt_millis(self, host: str) -> float:
+        stat = self._request_stats.get(host)
+        if stat is None or stat.rtt_ewma == 0:
+            return _DEFAULT_RTT_MILLIS
+        return stat.rtt_ewma
+
+    def _is_first_host(self, host: str) -> bool:
+        host_config = self._host_config
+        if host_config is None:
+            return False
+        for path in host_config:
+            hosts = host_config[path]
+            if len(hosts) > 0 and hosts[0] == host:
+                return True
+        return False
+
+    def _rerank_hosts(self):
+        if len(self._host_scores) == 0:
+            return
+        self._rerank_pending = True
+        # never block the request thread, the running scoring round reranks once it releases the lock,
+        # as it may have ranked hosts before the change
+        if not self._update_lock.acquire(blocking=False):
+            return
+        try:
+            self._rerank_pending = False
+            self._sort_and_set_hosts("rerank_" + str(uuid.uuid1()), self._host_config)
+        finally:
+            self._update_lock.release()
+
+    # called after releasing _update_lock
+    def _run_pending_rerank(self):
+        if self._rerank_pending:
+            self._rerank_hosts()
+
     @staticmethod
     def _distinct_hosts(host_config: Dict[str, List[str]]):
         host_set = set()
@@ -157,14 +477,35 @@ class AbstractHostAvailabler(object):
                 return False
         return True
 
+    # The best ranked host of the path other than exclude_host, None if there is no such host.
+    # Hedged and retried requests are sent to it.
+    def get_backup_host(self, path: str, exclude_host: str) -> Optional[str]:
+        for host in self.get_ranked_hosts(path):
+            if host != exclude_host:
+                return host
+        return None
+
+    # Hosts of the path from the best to the worst, without the hosts whose circuit breaker is open.
+    def get_ranked_hosts(self, path: str) -> List[str]:
+        hosts = self._host_config.get(path)
+        if hosts is None or len(hosts) == 0:
+            hosts = self._host_config.get("*")
+        return self._filter_allowed_hosts(hosts)
+
     def get_hosts(self) -> List[str]:
         return self._distinct_hosts(self._host_config)
 
     def get_host(self, path: str) -> str:
+        selections = self._host_selections
+        selection = selections.get(path)
+        if selection is None:
+            selection = selections.get("*")
+        if selection is not None:
+            return self._host_selector.select(selection)
         hosts = self._host_config.get(path)
         if hosts is None or len(hosts) == 0:
-            return self._host_config.get("*")[0]
-        return hosts[0]
+            hosts = self._host_config.get("*")
+        return self._filter_allowed_hosts(hosts)[0]
 
     def shutdown(self):
         if self._cancel is not None:
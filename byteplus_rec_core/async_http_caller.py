@@ -0,0 +1,246 @@
+import asyncio
+import gzip
+import logging
+import time
+from typing import Optional, Union, Dict, List
+from urllib.parse import urlparse
+
+from google.protobuf.message import Message
+
+from byteplus_rec_core import constant, utils
+from byteplus_rec_core.abtract_host_availabler import AbstractHostAvailabler
+from byteplus_rec_core.auth import _Credential
+from byteplus_rec_core.concurrency_limiter import AdaptiveConcurrencyLimiter
+from byteplus_rec_core.exception import BizException, NetException, StatusException, DeadlineExceededException
+from byteplus_rec_core.http_caller import _BaseHTTPCaller, Config, _DEFAULT_PING_URL_FORMAT, \
+    _DEFAULT_PING_TIMEOUT_SECONDS, _CONTENT_TYPE_JSON, _CONTENT_TYPE_PB
+from byteplus_rec_core.metrics.metrics import Metrics
+from byteplus_rec_core.option import Option
+from byteplus_rec_core.options import Options
+from byteplus_rec_core.rate_limiter import RateLimiter
+from byteplus_rec_core.retry_policy import RetryPolicy
+from byteplus_rec_core.utils import HTTPRequest
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+log = logging.getLogger(__name__)
+
+
+class _AsyncHTTPCaller(_BaseHTTPCaller):
+    def __init__(self,
+                 project_id: str,
+                 tenant_id: str,
+                 air_auth_token: str,
+                 host_availabler: AbstractHostAvailabler,
+                 caller_config: Config,
+                 schema: str,
+                 keep_alive: bool,
+                 credential: _Credential = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 rate_limiters: Optional[Dict[str, RateLimiter]] = None):
+        if aiohttp is None:
+            raise BizException("aiohttp is required by the async client, "
+                               "install it by 'pip install byteplus-rec-core[async]'")
+        super().__init__(project_id, tenant_id, air_auth_token, host_availabler,
+                         caller_config, schema, keep_alive, credential, retry_policy, rate_limiters)
+        # aiohttp.ClientSession must be created inside the event loop, so it is created lazily.
+        self._http_cli: Optional[aiohttp.ClientSession] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    # must be called in a running event loop
+    def start(self):
+        if self._http_cli is None:
+            # limit_per_host plays the role of pool_maxsize of the blocking caller
+            connector = aiohttp.TCPConnector(limit=0, limit_per_host=self._config.max_idle_connections)
+            self._http_cli = aiohttp.ClientSession(connector=connector)
+            self._prewarm()
+        if self._heartbeat_enabled() and self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.ensure_future(self._heartbeat_loop())
+
+    def _prewarm(self):
+        host, count = self._prewarm_target()
+        if host is None:
+            return
+        for _ in range(count):
+            asyncio.ensure_future(utils.async_ping(self._project_id, self._http_cli, _DEFAULT_PING_URL_FORMAT,
+                                                   self._schema, host, _DEFAULT_PING_TIMEOUT_SECONDS))
+
+    async def _heartbeat_loop(self):
+        # heartbeat at once like the blocking caller, so that the standby connection is warm from the start
+        while True:
+            try:
+                await self._heartbeat()
+            except asyncio.CancelledError:
+                raise
+            except BaseException as e:
+                log.error("[ByteplusSDK] async heartbeat occur exception, project_id:%s, err:%r",
+                          self._project_id, e)
+            await asyncio.sleep(self._config.keep_alive_ping_interval_seconds)
+
+    async def _heartbeat(self):
+        pings = []
+        for host in self._heartbeat_hosts():
+            metrics_tags = [
+                "from:http_caller",
+                "project_id:" + self._project_id,
+                "host:" + utils.escape_metrics_tag_value(host)
+            ]
+            Metrics.counter(constant.METRICS_KEY_HEARTBEAT_COUNT, 1, *metrics_tags)
+            pings.append(utils.async_ping(self._project_id, self._http_cli, _DEFAULT_PING_URL_FORMAT,
+                                          self._schema, host, _DEFAULT_PING_TIMEOUT_SECONDS))
+        await asyncio.gather(*pings)
+
+    async def do_json_request(self, url: str, request: Union[dict, list], *opts: Option) -> Union[dict, list]:
+        options: Options = Option.conv_to_options(opts)
+        req_bytes: bytes = self._encode_json_request(request)
+        content_type: str = _CONTENT_TYPE_JSON
+        rsp_bytes = await self._do_request(url, req_bytes, content_type, options)
+        return self._decode_json_response(url, rsp_bytes)
+
+    async def do_pb_request(self, url: str, request: Message, response: Message, *opts: Option):
+        options: Options = Option.conv_to_options(opts)
+        req_bytes: bytes = request.SerializeToString()
+        content_type: str = _CONTENT_TYPE_PB
+        rsp_bytes = await self._do_request(url, req_bytes, content_type, options)
+        self._decode_pb_response(url, rsp_bytes, response)
+
+    async def _do_request(self, url: str, req_bytes: bytes, content_type: str, options: Options) -> Optional[bytes]:
+        self.start()
+        req_bytes: bytes = gzip.compress(req_bytes)
+        req: HTTPRequest = self._build_request(url, req_bytes, content_type, options)
+        if self._retry_policy is None:
+            return await self._do_attempt(url, req, req_bytes, content_type, options)
+        self._retry_policy.on_request()
+        retry_times = 0
+        while True:
+            try:
+                return await self._do_attempt(url, req, req_bytes, content_type, options)
+            except asyncio.CancelledError:
+                raise
+            except BaseException as e:
+                if not self._retry_policy.is_retryable(e):
+                    raise
+                backoff = self._retry_policy.next_backoff_seconds(e, retry_times, *self._retry_metrics_tags(url))
+                if backoff is None:
+                    raise
+                if not self._has_time_for_attempt(options, urlparse(url).netloc, backoff):
+                    log.warning("[ByteplusSDK] deadline is too close to retry, url:%s, err:%s", url, e)
+                    raise
+                log.warning("[ByteplusSDK] retry request after %.3fs, url:%s, err:%s", backoff, url, e)
+            await asyncio.sleep(backoff)
+            retry_times += 1
+            url, req = self._new_retry_request(url, req, req_bytes, content_type, options)
+
+    async def _do_attempt(self, url: str, req: HTTPRequest, req_bytes: bytes, content_type: str,
+                          options: Options) -> Optional[bytes]:
+        if options.hedge:
+            return await self._do_hedged_http_request(url, req, req_bytes, content_type, options)
+        return await self._do_http_request(req, options)
+
+    async def _do_hedged_http_request(self, url: str, req: HTTPRequest, req_bytes: bytes, content_type: str,
+                                      options: Options) -> Optional[bytes]:
+        self._hedge_budget.deposit()
+        primary: asyncio.Future = asyncio.ensure_future(self._do_http_request(req, options))
+        done, _ = await asyncio.wait([primary], timeout=self._hedge_delay_seconds(url, options))
+        if len(done) > 0:
+            return primary.result()
+        hedge_req: Optional[HTTPRequest] = self._new_hedge_request(url, req, req_bytes, content_type, options)
+        if hedge_req is None:
+            return await primary
+        hedge: asyncio.Future = asyncio.ensure_future(self._do_http_request(hedge_req, options))
+        pending = {primary, hedge}
+        try:
+            while len(pending) > 0:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        continue
+                    if task is hedge:
+                        self._report_hedge(url, "won")
+                    return task.result()
+            return primary.result()
+        finally:
+            # unlike the blocking client, the losing request is really aborted
+            for task in pending:
+                task.cancel()
+
+    async def _do_http_request(self, req: HTTPRequest, options: Options) -> Optional[bytes]:
+        url: str = req.url
+        parse_result = urlparse(url)
+        host: str = parse_result.netloc
+        rate_limiters: List[RateLimiter] = self._get_rate_limiters(parse_result.path)
+        for rate_limiter in rate_limiters:
+            wait_start = time.time()
+            acquired = await rate_limiter.acquire_async(self._rate_limit_wait_seconds(rate_limiter, options))
+            self._report_rate_limit_acquire(url, acquired, int((time.time() - wait_start) * 1000))
+        limiter: Optional[AdaptiveConcurrencyLimiter] = self._get_concurrency_limiter(host)
+        if limiter is not None:
+            wait_start = time.time()
+            acquired = await limiter.acquire_async(self._concurrency_queue_wait_seconds(options))
+            self._report_concurrency_acquire(url, host, limiter, acquired, int((time.time() - wait_start) * 1000))
+        try:
+            # the limiters may have waited, so the time left is only known now
+            timeout_secs = self._attempt_timeout_seconds(options)
+            self._with_deadline_headers(req.header, options, host)
+        except DeadlineExceededException:
+            # the request is not sent, it says nothing about the host
+            if limiter is not None:
+                limiter.release_without_feedback()
+            raise
+        timeout = None
+        if timeout_secs is not None:
+            timeout = aiohttp.ClientTimeout(total=timeout_secs)
+        self._host_availabler.report_request_start(host)
+        host_ok = False
+        cancelled = False
+        start = time.time()
+        log.debug("[ByteplusSDK][AsyncHTTPCaller] URL:%s, Request Headers:\n%s", url, req.header)
+        try:
+            # aiohttp decompresses the gzip response as well
+            async with self._http_cli.post(url, headers=req.header, data=req.req_bytes, timeout=timeout) as rsp:
+                rsp_bytes: bytes = await rsp.read()
+                host_ok = rsp.status < constant.HTTP_STATUS_INTERNAL_SERVER_ERROR
+                self._feedback_rate_limiters(rate_limiters, url, rsp.status, rsp.headers)
+                if rsp.status != constant.HTTP_STATUS_OK:
+                    self._log_err_http_rsp(url, rsp.status, rsp.reason, rsp.headers, rsp_bytes)
+                    raise StatusException("code:{} msg:{}".format(rsp.status, rsp.reason), rsp.status,
+                                          utils.parse_retry_after(rsp.headers.get("Retry-After")))
+        except asyncio.CancelledError:
+            # cancelled by the caller, such as the losing hedged request, it says nothing about the host
+            cancelled = True
+            raise
+        except BaseException as e:
+            cost = int((time.time() - start) * 1000)
+            # asyncio.TimeoutError carries no message, so it is checked by type
+            if isinstance(e, asyncio.TimeoutError) or self._is_timeout_exception(e):
+                self._report_request_exception(url, e, cost, True)
+                raise NetException(str(e) or "request timeout")
+            self._report_request_exception(url, e, cost, False)
+            if isinstance(e, StatusException):
+                raise
+            raise BizException(str(e))
+        finally:
+            cost = int((time.time() - start) * 1000)
+            if cancelled:
+                if limiter is not None:
+                    limiter.release_without_feedback()
+                self._host_availabler.report_request_cancel(host)
+            else:
+                if limiter is not None:
+                    limiter.release(host_ok, cost)
+                self._report_request_finish(url, host, parse_result.path, cost, host_ok)
+        return rsp_bytes
+
+    def shutdown(self):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+
+    async def close(self):
+        self.shutdown()
+        if self._http_cli is not None:
+            await self._http_cli.close()
+            self._http_cli = None
@@ -0,0 +1,65 @@
+import asyncio
+from typing import Union
+
+from google.protobuf.message import Message
+
+from byteplus_rec_core import utils
+from byteplus_rec_core.abtract_host_availabler import AbstractHostAvailabler
+from byteplus_rec_core.async_http_caller import _AsyncHTTPCaller
+from byteplus_rec_core.async_ping_host_availabler import AsyncPingHostAvailabler
+from byteplus_rec_core.option import Option, RequestProfile
+
+
+# The asyncio counterpart of HTTPClient, built by _HTTPClientBuilder.build_async().
+# Host scoring and heartbeat run as tasks of the event loop which sends the first request,
+# call `await start()` to launch them earlier.
+class AsyncHTTPClient(object):
+    def __init__(self, http_caller: _AsyncHTTPCaller, host_availabler: AbstractHostAvailabler,
+                 schema: str, project_id: str):
+        self._http_caller = http_caller
+        self._host_availabler = host_availabler
+        self._schema = schema
+        self._project_id = project_id
+        self._started = False
+
+    async def start(self):
+        self._start()
+
+    def _start(self):
+        if self._started:
+            return
+        if isinstance(self._host_availabler, AsyncPingHostAvailabler):
+            self._host_availabler.start()
+        self._http_caller.start()
+        self._started = True
+
+    async def do_pb_request(self, path: str, request: Message, response: Message, *opts: Option):
+        self._start()
+        await self._http_caller.do_pb_request(self._build_url(path), request, response, *opts)
+
+    async def do_json_request(self, path: str, request: Union[dict, list], *opts: Option) -> Union[dict, list]:
+        self._start()
+        return await self._http_caller.do_json_request(self._build_url(path), request, *opts)
+
+    # An asyncio future which is done when hosts are ranked by the first scoring round,
+    # must be called in a running event loop, it starts the client as well.
+    def ready(self) -> asyncio.Future:
+        self._start()
+        return asyncio.wrap_future(self._host_availabler.ready())
+
+    # Resolves the options once for the requests of a path, pass the profile as the only option of
+    # do_pb_request or do_json_request to skip building the same options and headers on every call.
+    def new_request_profile(self, *opts: Option) -> RequestProfile:
+        return self._http_caller.new_request_profile(*opts)
+
+    def _build_url(self, path: str):
+        host: str = self._host_availabler.get_host(path)
+        return utils.build_url(self._schema, host, path)
+
+    async def shutdown(self):
+        if isinstance(self._host_availabler, AsyncPingHostAvailabler):
+            await self._host_availabler.close()
+        else:
+            self._host_availabler.shutdown()
+        await self._http_caller.close()
+        self._started = False
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional, Dict
+
+from byteplus_rec_core import utils
+from byteplus_rec_core.abtract_host_availabler import HostAvailabilityScore
+from byteplus_rec_core.exception import BizException
+from byteplus_rec_core.host_snapshot import HostSnapshotConfig
+from byteplus_rec_core.ping_host_availabler import PingHostAvailabler, Config, _DEFAULT_PING_SCHEMA
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+log = logging.getLogger(__name__)
+
+
+class AsyncPingHostAvailabler(PingHostAvailabler):
+    # Scores hosts on the running event loop instead of a scheduler thread.
+    # The constructor never pings, hosts keep the configured order
+    # (main_host first) until the first scoring round of start() finishes.
+    def __init__(self, default_hosts: Optional[List[str]] = None,
+                 project_id: Optional[str] = None,
+                 config: Optional[Config] = None,
+                 main_host: Optional[str] = None,
+                 snapshot_config: Optional[HostSnapshotConfig] = None):
+        if aiohttp is None:
+            raise BizException("aiohttp is required by AsyncPingHostAvailabler, "
+                               "install it by 'pip install byteplus-rec-core[async]'")
+        self._task: Optional[asyncio.Task] = None
+        self._ping_session = None
+        super().__init__(default_hosts, project_id, config, main_host, snapshot_config=snapshot_config)
+
+    def init(self):
+        self._set_static_hosts(self._default_hosts)
+
+    # must be called in a running event loop
+    def start(self):
+        if self._task is not None:
+            return
+        self._task = asyncio.ensure_future(self._score_loop())
+
+    async def _score_loop(self):
+        while True:
+            try:
+                await self._async_score_and_update_hosts(self._host_config)
+            except asyncio.CancelledError:
+                raise
+            except BaseException as e:
+                log.error("[ByteplusSDK] async score hosts occur exception, project_id:%s, err:%r",
+                          self.project_id, e)
+            await asyncio.sleep(self._score_host_interval_seconds)
+
+    async def _async_score_and_update_hosts(self, host_config: Dict[str, List[str]]):
+        hosts: List[str] = self._distinct_hosts(host_config)
+        try:
+            new_host_scores: List[HostAvailabilityScore] = await self.async_do_score_hosts(hosts)
+            self._update_hosts(host_config, new_host_scores)
+        finally:
+            self._mark_ready()
+
+    async def async_do_score_hosts(self, hosts: List[str]) -> List[HostAvailabilityScore]:
+        log.debug("[ByteplusSDK] async do score hosts:'%s'", hosts)
+        if len(hosts) == 1:
+            return [HostAvailabilityScore(hosts[0], 0.0)]
+        if self._ping_session is None:
+            self._ping_session = aiohttp.ClientSession()
+        ping_results: List[bool] = await asyncio.gather(*[self._async_ping(host) for host in hosts])
+        return [self._put_ping_result(host, success) for host, success in zip(hosts, ping_results)]
+
+    async def _async_ping(self, host: str) -> bool:
+        start = time.time()
+        success = await utils.async_ping(self.project_id, self._ping_session, self._config.ping_url_format,
+                                         _DEFAULT_PING_SCHEMA, host, self._config.ping_timeout_seconds)
+        if success:
+            self.report_ping_rtt(host, int((time.time() - start) * 1000))
+        return success
+
+    def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._stop_snapshot()
+
+    async def close(self):
+        self.shutdown()
+        if self._ping_session is not None:
+            await self._ping_session.close()
+            self._ping_session = None
@@ -0,0 +1,99 @@
+import threading
+import time
+from typing import List, Tuple
+
+CIRCUIT_CLOSED: str = "closed"
+CIRCUIT_OPEN: str = "open"
+CIRCUIT_HALF_OPEN: str = "half_open"
+
+_DEFAULT_FAILURE_THRESHOLD: int = 5
+_DEFAULT_OPEN_SECONDS: float = 5
+_DEFAULT_HALF_OPEN_PROBES: int = 2
+
+
+class CircuitBreakerConfig(object):
+    def __init__(self,
+                 failure_threshold: int = _DEFAULT_FAILURE_THRESHOLD,
+                 open_seconds: float = _DEFAULT_OPEN_SECONDS,
+                 half_open_probes: int = _DEFAULT_HALF_OPEN_PROBES):
+        # the breaker opens after this number of consecutive failed requests
+        self.failure_threshold = max(1, failure_threshold)
+        # an open breaker waits this long before probing the host
+        self.open_seconds = open_seconds
+        # the breaker closes after this number of consecutive successful probes
+        self.half_open_probes = max(1, half_open_probes)
+
+
+# _CircuitBreaker tracks the state of one host:
+# - closed: the host receives requests, consecutive failed requests open the breaker.
+# - open: the host receives no requests until open_seconds passes, then the next probe turns it half-open.
+# - half_open: the host still receives no requests, consecutive successful probes close the breaker
+#   and a failed probe opens it again.
+# Probes are the pings of the host availabler. Real requests are still sent to the host when the breakers
+# of all hosts are not closed, the results of those sent after the breaker turns half-open count as probes,
+# the other results of an open or half-open breaker are ignored, as they were sent before it opened.
+# Both methods return the state transitions as (old state, new state).
+class _CircuitBreaker(object):
+    def __init__(self, config: CircuitBreakerConfig):
+        self._config = config
+        self.state: str = CIRCUIT_CLOSED
+        self._consecutive_failures: int = 0
+        self._probe_successes: int = 0
+        self._opened_time: float = 0
+        self._half_open_time: float = 0
+        self._lock = threading.Lock()
+
+    def is_closed(self) -> bool:
+        return self.state == CIRCUIT_CLOSED
+
+    # sent_time is the time.time() when the request was sent
+    def on_request_result(self, success: bool, sent_time: float) -> List[Tuple[str, str]]:
+        if success and self.state == CIRCUIT_CLOSED:
+            # the hot path, a lost update only delays opening by one failure
+            self._consecutive_failures = 0
+            return []
+        with self._lock:
+            if self.state == CIRCUIT_OPEN:
+                return []
+            if self.state == CIRCUIT_HALF_OPEN:
+                if sent_time < self._half_open_time:
+                    return []
+                return self._on_half_open_result(success)
+            if success:
+                self._consecutive_failures = 0
+                return []
+            self._consecutive_failures += 1
+            if self._consecutive_failures < self._config.failure_threshold:
+                return []
+            return [self._transit(CIRCUIT_OPEN)]
+
+    def on_probe_result(self, success: bool) -> List[Tuple[str, str]]:
+        if self.state == CIRCUIT_CLOSED:
+            return []
+        with self._lock:
+            transitions: List[Tuple[str, str]] = []
+            if self.state == CIRCUIT_OPEN:
+                if time.time() - self._opened_time < self._config.open_seconds:
+                    return transitions
+                transitions.append(self._transit(CIRCUIT_HALF_OPEN))
+            transitions.extend(self._on_half_open_result(success))
+            return transitions
+
+    def _on_half_open_result(self, success: bool) -> List[Tuple[str, str]]:
+        if not success:
+            return [self._transit(CIRCUIT_OPEN)]
+        self._probe_successes += 1
+        if self._probe_successes >= self._config.half_open_probes:
+            return [self._transit(CIRCUIT_CLOSED)]
+        return []
+
+    def _transit(self, state: str) -> Tuple[str, str]:
+        old_state = self.state
+        self.state = state
+        self._consecutive_failures = 0
+        self._probe_successes = 0
+        if state == CIRCUIT_OPEN:
+            self._opened_time = time.time()
+        elif state == CIRCUIT_HALF_OPEN:
+            self._half_open_time = time.time()
+        return old_state, state
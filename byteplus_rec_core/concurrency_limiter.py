@@ -0,0 +1,162 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Optional, Deque, Callable
+
+_DEFAULT_INITIAL_LIMIT: int = 20
+_DEFAULT_MIN_LIMIT: int = 1
+_DEFAULT_MAX_LIMIT: int = 200
+_DEFAULT_BACKOFF_RATIO: float = 0.9
+_DEFAULT_LATENCY_TOLERANCE: float = 2.0
+# how fast the no-load latency follows higher latencies, so that it recovers from an outlier
+_MIN_LATENCY_RISE_RATIO: float = 0.001
+
+
+class ConcurrencyLimitConfig(object):
+    def __init__(self,
+                 initial_limit: int = _DEFAULT_INITIAL_LIMIT,
+                 min_limit: int = _DEFAULT_MIN_LIMIT,
+                 max_limit: int = _DEFAULT_MAX_LIMIT,
+                 backoff_ratio: float = _DEFAULT_BACKOFF_RATIO,
+                 latency_tolerance: float = _DEFAULT_LATENCY_TOLERANCE,
+                 max_queue_wait_seconds: float = 0):
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        # the limit is multiplied by backoff_ratio when a request fails or is too slow
+        self.backoff_ratio = backoff_ratio
+        # a request is too slow if its latency exceeds latency_tolerance times the no-load latency
+        self.latency_tolerance = latency_tolerance
+        # requests over the limit wait at most this long for a slot, 0 rejects them at once
+        self.max_queue_wait_seconds = max_queue_wait_seconds
+
+
+# AdaptiveConcurrencyLimiter bounds the in-flight requests of one host with an AIMD limit:
+# the limit grows by one after `limit` successful requests, and shrinks by backoff_ratio
+# (at most once per observed latency) when a request fails or its latency exceeds
+# latency_tolerance times the no-load latency.
+class AdaptiveConcurrencyLimiter(object):
+    def __init__(self, config: ConcurrencyLimitConfig):
+        self._config = config
+        self._limit: float = float(config.initial_limit)
+        self._in_flight: int = 0
+        self._min_latency: Optional[float] = None
+        self._last_decrease_time: float = 0
+        self._lock = threading.Lock()
+        # callables waking up waiting acquirers in FIFO order
+        self._waiters: Deque[Callable] = deque()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            return self._try_acquire_locked()
+
+    def _try_acquire_locked(self) -> bool:
+        if self._in_flight < int(self._limit):
+            self._in_flight += 1
+            return True
+        return False
+
+    def acquire(self, timeout_seconds: float) -> bool:
+        if self.try_acquire():
+            return True
+        deadline = time.monotonic() + timeout_seconds
+        event = threading.Event()
+        while True:
+            with self._lock:
+                if self._try_acquire_locked():
+                    return True
+                self._waiters.append(event.set)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not event.wait(remaining):
+                self._remove_waiter(event.set)
+                return self.try_acquire()
+            event.clear()
+
+    async def acquire_async(self, timeout_seconds: float) -> bool:
+        if self.try_acquire():
+            return True
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout_seconds
+        while True:
+            future = loop.create_future()
+
+            def wake(f=future):
+                # release may run in another thread
+                loop.call_soon_threadsafe(lambda: f.done() or f.set_result(True))
+
+            with self._lock:
+                if self._try_acquire_locked():
+                    return True
+                self._waiters.append(wake)
+            remaining = deadline - loop.time()
+            woken = False
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                await asyncio.wait_for(future, remaining)
+                woken = True
+            except asyncio.TimeoutError:
+                return self.try_acquire()
+            finally:
+                if not self._remove_waiter(wake) and not woken:
+                    # woken up by release but cancelled or timed out before taking the slot,
+                    # so the next waiter is woken up instead
+                    self._wake_waiters()
+
+    # returns False if the waiter is not waiting any more, as release has woken it up
+    def _remove_waiter(self, waiter: Callable) -> bool:
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+                return True
+            except ValueError:
+                return False
+
+    def release(self, success: bool, latency_ms: int):
+        self._release(success, latency_ms)
+
+    # Returns the slot of a request which says nothing about the host, such as a request
+    # which is never sent or is cancelled, the limit is left unchanged.
+    def release_without_feedback(self):
+        self._release(None, 0)
+
+    def _release(self, success: Optional[bool], latency_ms: int):
+        with self._lock:
+            self._in_flight -= 1
+            if success is not None:
+                self._update_limit(success, latency_ms)
+        self._wake_waiters()
+
+    # wakes up as many waiters as the free slots, they compete for the slots with new acquirers
+    def _wake_waiters(self):
+        with self._lock:
+            wakes = []
+            while len(self._waiters) > 0 and len(wakes) < int(self._limit) - self._in_flight:
+                wakes.append(self._waiters.popleft())
+        for wake in wakes:
+            wake()
+
+    def _update_limit(self, success: bool, latency_ms: int):
+        if self._min_latency is None or latency_ms < self._min_latency:
+            self._min_latency = float(latency_ms)
+        else:
+            self._min_latency += (latency_ms - self._min_latency) * _MIN_LATENCY_RISE_RATIO
+        too_slow = latency_ms > max(self._min_latency, 1) * self._config.latency_tolerance
+        if success and not too_slow:
+            self._limit = min(float(self._config.max_limit), self._limit + 1 / self._limit)
+            return
+        now = time.monotonic()
+        # requests in flight together fail together, only shrink once for them
+        if now - self._last_decrease_time < max(latency_ms, 1) / 1000:
+            return
+        self._last_decrease_time = now
+        self._limit = max(float(self._config.min_limit), self._limit * self._config.backoff_ratio)
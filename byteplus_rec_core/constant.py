@@ -2,6 +2,11 @@ HTTP_STATUS_OK: int = 200
 
 HTTP_STATUS_NOT_FOUND: int = 404
 
+HTTP_STATUS_INTERNAL_SERVER_ERROR: int = 500
+HTTP_STATUS_BAD_GATEWAY: int = 502
+HTTP_STATUS_SERVICE_UNAVAILABLE: int = 503
+HTTP_STATUS_GATEWAY_TIMEOUT: int = 504
+
 # The request was executed successfully without any exception
 STATUS_CODE_SUCCESS: int = 0
 # A Request with the same "Request-ID" was already received. This Request was rejected
@@ -26,3 +31,16 @@ METRICS_KEY_COMMON_ERROR = "common.err"
 METRICS_KEY_REQUEST_TOTAL_COST = "request.total.cost"
 METRICS_KEY_REQUEST_COUNT = "request.count"
 METRICS_KEY_HEARTBEAT_COUNT = "heartbeat.count"
+METRICS_KEY_REQUEST_HEDGE = "request.hedge"
+METRICS_KEY_REQUEST_RETRY = "request.retry"
+METRICS_KEY_CONCURRENCY_LIMIT = "concurrency.limit"
+METRICS_KEY_CONCURRENCY_IN_FLIGHT = "concurrency.in_flight"
+METRICS_KEY_CONCURRENCY_QUEUE_COST = "concurrency.queue.cost"
+METRICS_KEY_CONCURRENCY_REJECT = "concurrency.reject"
+METRICS_KEY_RATE_LIMIT_WAIT_COST = "rate_limit.wait.cost"
+METRICS_KEY_RATE_LIMIT_REJECT = "rate_limit.reject"
+METRICS_KEY_RATE_LIMIT_RATE = "rate_limit.rate"
+METRICS_KEY_CIRCUIT_BREAKER_TRANSITION = "circuit_breaker.transition"
+METRICS_KEY_SCHEDULER_TASK_COST = "scheduler.task.cost"
+METRICS_KEY_SCHEDULER_TASK_DELAY = "scheduler.task.delay"
+METRICS_KEY_SCHEDULER_TASK_SKIP = "scheduler.task.skip"
@@ -1,3 +1,6 @@
+from typing import Optional
+
+
 class BizException(Exception):
     def __init__(self, msg: str):
         Exception.__init__(self, msg)
@@ -5,4 +8,33 @@ class BizException(Exception):
 
 class NetException(Exception):
     def __init__(self, msg: str):
-        Exception.__init__(self, msg)
\ No newline at end of file
+        Exception.__init__(self, msg)
+
+
+# Raised when the server responds with a non-200 http status.
+class StatusException(BizException):
+    def __init__(self, msg: str, status_code: int, retry_after_seconds: Optional[float] = None):
+        BizException.__init__(self, msg)
+        self.status_code = status_code
+        # parsed from the Retry-After header, None if absent
+        self.retry_after_seconds = retry_after_seconds
+
+
+# Raised when the deadline set by Option.with_deadline is too close for the request to succeed,
+# the request is not sent (again) in this case.
+class DeadlineExceededException(BizException):
+    def __init__(self, msg: str):
+        BizException.__init__(self, msg)
+
+
+# Raised when the in-flight requests of a host reach the adaptive concurrency limit
+# and no slot is released within the queue wait time.
+class ConcurrencyLimitException(BizException):
+    def __init__(self, msg: str):
+        BizException.__init__(self, msg)
+
+
+# Raised when a request cannot be sent within the wait time of a RateLimiter.
+class RateLimitException(BizException):
+    def __init__(self, msg: str):
+        BizException.__init__(self, msg)
@@ -2,13 +2,31 @@ from abc import abstractmethod
 from typing import List, Optional
 
 from byteplus_rec_core.abtract_host_availabler import AbstractHostAvailabler
+from byteplus_rec_core.async_ping_host_availabler import AsyncPingHostAvailabler
+from byteplus_rec_core.host_snapshot import HostSnapshotConfig
 from byteplus_rec_core.ping_host_availabler import PingHostAvailabler, Config
 
 
 # Implement custom HostAvailabler by overriding HostAvailablerFactory.
+# blocking_init and snapshot_config are only passed when they are set on _HTTPClientBuilder.
+# build_async calls new_async_host_availabler instead, so a factory used with build_async must override it.
 class HostAvailablerFactory(object):
     @abstractmethod
     def new_host_availabler(self, hosts: List[str],
                             project_id: Optional[str] = "",
-                            main_host: Optional[str] = None) -> AbstractHostAvailabler:
-        return PingHostAvailabler(hosts, project_id, config=None, main_host=main_host)
+                            main_host: Optional[str] = None,
+                            blocking_init: bool = True,
+                            snapshot_config: Optional[HostSnapshotConfig] = None) -> AbstractHostAvailabler:
+        return PingHostAvailabler(hosts, project_id, config=None, main_host=main_host, blocking_init=blocking_init,
+                                  snapshot_config=snapshot_config)
+
+    # The host availabler of the AsyncHTTPClient, it must not block the event loop.
+    # An AsyncPingHostAvailabler is started by the client, it scores hosts on the running event loop
+    # and never blocks the build, so blocking_init is ignored.
+    def new_async_host_availabler(self, hosts: List[str],
+                                  project_id: Optional[str] = "",
+                                  main_host: Optional[str] = None,
+                                  blocking_init: bool = True,
+                                  snapshot_config: Optional[HostSnapshotConfig] = None) -> AbstractHostAvailabler:
+        return AsyncPingHostAvailabler(hosts, project_id, config=None, main_host=main_host,
+                                       snapshot_config=snapshot_config)
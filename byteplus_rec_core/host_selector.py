@@ -0,0 +1,130 @@
+import itertools
+import random
+from abc import abstractmethod
+from typing import List, Dict
+
+_DEFAULT_ROUND_ROBIN_EPSILON: float = 0.05
+
+
+# HostSelector decides which host AbstractHostAvailabler.get_host returns.
+# `prepare` runs off the request path whenever hosts are ranked and returns an
+# immutable selection, `select` runs on every request without any lock and must cost O(1).
+# hosts are sorted from the best to the worst and scores are in the same order.
+# When main_host is prioritized, only the main host is passed to `prepare`.
+class HostSelector(object):
+    @abstractmethod
+    def prepare(self, hosts: List[str], scores: List[float], host_stats: Dict[str, object]) -> object:
+        raise NotImplementedError
+
+    @abstractmethod
+    def select(self, selection: object) -> str:
+        raise NotImplementedError
+
+
+# Always the best ranked host, the default behavior.
+class FirstHostSelector(HostSelector):
+    def prepare(self, hosts: List[str], scores: List[float], host_stats: Dict[str, object]) -> object:
+        return hosts[0]
+
+    def select(self, selection: object) -> str:
+        return selection
+
+
+class _AliasTable(object):
+    def __init__(self, hosts: List[str], probabilities: List[float], aliases: List[int]):
+        self.hosts = hosts
+        self.probabilities = probabilities
+        self.aliases = aliases
+
+
+# Picks hosts randomly with probability proportional to their scores,
+# using Vose's alias method so that one selection costs O(1).
+class WeightedRandomHostSelector(HostSelector):
+    def prepare(self, hosts: List[str], scores: List[float], host_stats: Dict[str, object]) -> object:
+        weights = [max(score, 0.0) for score in scores]
+        total = sum(weights)
+        if total <= 0:
+            return _AliasTable([hosts[0]], [1.0], [0])
+        n = len(hosts)
+        scaled = [weight * n / total for weight in weights]
+        probabilities = [1.0] * n
+        aliases = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while len(small) > 0 and len(large) > 0:
+            s = small.pop()
+            g = large.pop()
+            probabilities[s] = scaled[s]
+            aliases[s] = g
+            scaled[g] = scaled[g] + scaled[s] - 1.0
+            if scaled[g] < 1.0:
+                small.append(g)
+            else:
+                large.append(g)
+        return _AliasTable(list(hosts), probabilities, aliases)
+
+    def select(self, selection: object) -> str:
+        table: _AliasTable = selection
+        i = int(random.random() * len(table.hosts))
+        if random.random() < table.probabilities[i]:
+            return table.hosts[i]
+        return table.hosts[table.aliases[i]]
+
+
+# Rotates among the hosts whose score is within epsilon of the best score.
+class RoundRobinHostSelector(HostSelector):
+    def __init__(self, epsilon: float = _DEFAULT_ROUND_ROBIN_EPSILON):
+        self._epsilon = epsilon
+        # next() of itertools.count is atomic in CPython, so no lock is needed
+        self._counter = itertools.count()
+
+    def prepare(self, hosts: List[str], scores: List[float], host_stats: Dict[str, object]) -> object:
+        best_score = scores[0]
+        return [host for host, score in zip(hosts, scores) if score >= best_score - self._epsilon]
+
+    def select(self, selection: object) -> str:
+        candidates: List[str] = selection
+        return candidates[next(self._counter) % len(candidates)]
+
+
+class _P2CSelection(object):
+    def __init__(self, hosts: List[str], scores: List[float], host_stats: Dict[str, object]):
+        self.hosts = hosts
+        self.scores = scores
+        self.host_stats = host_stats
+
+
+# Power of two choices: samples two hosts and sends the request to the one with less load,
+# where load = (in-flight requests + 1) * latency EWMA / score.
+# Hosts with a score below min_score_ratio of the best score are not sampled.
+class PowerOfTwoChoicesHostSelector(HostSelector):
+    def __init__(self, min_score_ratio: float = 0.5):
+        self._min_score_ratio = min_score_ratio
+
+    def prepare(self, hosts: List[str], scores: List[float], host_stats: Dict[str, object]) -> object:
+        min_score = scores[0] * self._min_score_ratio
+        candidates = [(host, score) for host, score in zip(hosts, scores) if score >= min_score and score > 0]
+        if len(candidates) == 0:
+            candidates = [(hosts[0], scores[0])]
+        return _P2CSelection([c[0] for c in candidates], [c[1] for c in candidates], host_stats)
+
+    def select(self, selection: object) -> str:
+        p2c: _P2CSelection = selection
+        n = len(p2c.hosts)
+        if n == 1:
+            return p2c.hosts[0]
+        i = random.randrange(n)
+        j = random.randrange(n - 1)
+        if j >= i:
+            j += 1
+        if self._load(p2c, j) < self._load(p2c, i):
+            return p2c.hosts[j]
+        return p2c.hosts[i]
+
+    @staticmethod
+    def _load(p2c: _P2CSelection, index: int) -> float:
+        stat = p2c.host_stats.get(p2c.hosts[index])
+        if stat is None:
+            return 1.0 / p2c.scores[index]
+        return (stat.in_flight() + 1) * max(stat.latency_ewma, 1.0) / p2c.scores[index]
+
@@ -0,0 +1,73 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+log = logging.getLogger(__name__)
+
+_SNAPSHOT_VERSION: int = 1
+_DEFAULT_SNAPSHOT_INTERVAL_SECONDS: float = 30
+_DEFAULT_SNAPSHOT_MAX_AGE_SECONDS: float = 600
+
+
+class HostSnapshotConfig(object):
+    def __init__(self, path: str,
+                 interval_seconds: float = _DEFAULT_SNAPSHOT_INTERVAL_SECONDS,
+                 max_age_seconds: float = _DEFAULT_SNAPSHOT_MAX_AGE_SECONDS):
+        # the snapshot file, use one file per project
+        self.path = path
+        # the snapshot is written every interval_seconds and at shutdown
+        self.interval_seconds = interval_seconds
+        # a snapshot older than max_age_seconds is ignored, a younger one is trusted in proportion to its age
+        self.max_age_seconds = max_age_seconds
+
+
+# Writes the ping results of each host (from the oldest to the newest) to config.path.
+# The file is replaced atomically, readers never see a partially written snapshot.
+def save_host_snapshot(config: HostSnapshotConfig, project_id: str, host_results: Dict[str, List[bool]]):
+    snapshot = {
+        "version": _SNAPSHOT_VERSION,
+        "project_id": project_id,
+        "time": time.time(),
+        "hosts": host_results,
+    }
+    directory = os.path.dirname(os.path.abspath(config.path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".host_snapshot_", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, config.path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# Reads the ping results saved by save_host_snapshot, an empty dict if there is no usable snapshot.
+# The results decay by the age of the snapshot: only the newest (1 - age / max_age) part of
+# the results of each host is kept, the older results are treated as successes.
+def load_host_snapshot(config: HostSnapshotConfig, project_id: str) -> Dict[str, List[bool]]:
+    try:
+        with open(config.path, "r") as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except BaseException as e:
+        log.warning("[ByteplusSDK] load host snapshot fail, path:%s, err:%s", config.path, e)
+        return {}
+    if not isinstance(snapshot, dict) or snapshot.get("version") != _SNAPSHOT_VERSION \
+            or snapshot.get("project_id") != project_id:
+        return {}
+    age = time.time() - snapshot.get("time", 0)
+    if age < 0 or age >= config.max_age_seconds:
+        return {}
+    keep_ratio = 1 - age / config.max_age_seconds
+    host_results: Dict[str, List[bool]] = {}
+    for host, results in snapshot.get("hosts", {}).items():
+        drop_count = len(results) - int(round(len(results) * keep_ratio))
+        host_results[host] = [True] * drop_count + [bool(r) for r in results[drop_count:]]
+    return host_results
@@ -1,3 +1,4 @@
+import contextvars
 import gzip
 import hashlib
 import json
@@ -7,38 +8,97 @@ import string
 import threading
 import time
 import uuid
-from typing import Optional, Union
-import requests
-from requests import Response, Session
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, Union, Dict, List, Tuple
+from urllib.parse import urlparse
 
 from google.protobuf.message import Message
-from requests.adapters import HTTPAdapter
 
 from byteplus_rec_core import constant, utils
 from byteplus_rec_core.abtract_host_availabler import AbstractHostAvailabler
-from byteplus_rec_core.exception import BizException, NetException
+from byteplus_rec_core.concurrency_limiter import ConcurrencyLimitConfig, AdaptiveConcurrencyLimiter
+from byteplus_rec_core.exception import BizException, NetException, StatusException, DeadlineExceededException, \
+    ConcurrencyLimitException, RateLimitException
 from byteplus_rec_core.metrics.metrics import Metrics
+from byteplus_rec_core.metrics.metrics_handle import CounterHandle, TimerHandle
 from byteplus_rec_core.metrics.metrics_log import MetricsLog
-from byteplus_rec_core.option import Option
+from byteplus_rec_core.option import Option, RequestProfile
 from byteplus_rec_core.options import Options
-from byteplus_rec_core.utils import _milliseconds, HTTPRequest
+from byteplus_rec_core.rate_limiter import RateLimiter
+from byteplus_rec_core.retry_policy import RetryPolicy
+from byteplus_rec_core.transport import Transport, RequestsTransport
+from byteplus_rec_core.utils import _milliseconds, HTTPRequest, _LatencyWindow, _RatioBudget
 from byteplus_rec_core.auth import _Credential, _sign
 
 log = logging.getLogger(__name__)
 
 _DEFAULT_PING_URL_FORMAT: str = "{}://{}/predict/api/ping"
 _DEFAULT_PING_TIMEOUT_SECONDS: float = 0.5
+_DEFAULT_HEDGE_BUDGET_RATIO: float = 0.1
+_DEFAULT_HEDGE_MAX_WORKERS: int = 64
+# returned by the hedge task when the hedge is not sent
+_HEDGE_NOT_SENT = object()
+# the hedge budget can hold at most this number of hedges, which allows short bursts
+_HEDGE_BUDGET_MAX_TOKENS: float = 10
+# used as hedge delay until enough latencies of the path are observed
+_DEFAULT_HEDGE_DELAY_SECONDS: float = 0.1
+_HEDGE_DELAY_PERCENTILE: float = 0.95
+_PATH_LATENCY_WINDOW_SIZE: int = 200
+_PATH_LATENCY_MIN_SAMPLES: int = 20
+_CONTENT_TYPE_JSON: str = "application/json"
+_CONTENT_TYPE_PB: str = "application/x-protobuf"
+# the cache of the metric handles is reset when it holds more urls, such as urls with varying queries
+_MAX_URL_METRIC_HANDLES: int = 1024
+
+# The request id of the request currently being executed.
+# A context variable works for both threads and asyncio tasks,
+# each of them sees its own value.
+_request_id_ctx: contextvars.ContextVar = contextvars.ContextVar("byteplus_rec_request_id", default="")
+
+
+# The metric handles of the requests to one url.
+class _URLMetricHandles(object):
+    def __init__(self, project_id: str, url: str):
+        self.request_total_cost: TimerHandle = Metrics.timer_handle(
+            constant.METRICS_KEY_REQUEST_TOTAL_COST, project_id=project_id, url=url)
+        self.request_count: CounterHandle = Metrics.counter_handle(
+            constant.METRICS_KEY_REQUEST_COUNT, project_id=project_id, url=url)
 
 
 class Config(object):
     def __init__(self,
                  max_idle_connections: Optional[int] = constant.DEFAULT_MAX_IDLE_CONNECTIONS,
-                 keep_alive_ping_interval_seconds: Optional[float] = constant.DEFAULT_KEEPALIVE_PING_INTERVAL_SECONDS):
+                 keep_alive_ping_interval_seconds: Optional[float] = constant.DEFAULT_KEEPALIVE_PING_INTERVAL_SECONDS,
+                 hedge_budget_ratio: float = _DEFAULT_HEDGE_BUDGET_RATIO,
+                 hedge_max_workers: int = _DEFAULT_HEDGE_MAX_WORKERS,
+                 concurrency_limit: Optional[ConcurrencyLimitConfig] = None,
+                 prewarm_connections: int = 0,
+                 warm_standby: bool = False,
+                 transport: Optional[Transport] = None):
         self.max_idle_connections = max_idle_connections
         self.keep_alive_ping_interval_seconds = keep_alive_ping_interval_seconds
+        # At most hedge_budget_ratio of the requests enabling Option.with_hedge send a hedged request.
+        self.hedge_budget_ratio = hedge_budget_ratio
+        # Hedged requests run on a thread pool of this size in the blocking HTTPClient,
+        # no hedge is sent while all the workers are busy.
+        self.hedge_max_workers = hedge_max_workers
+        # If set, the in-flight requests of each host are bounded by an adaptive concurrency limit.
+        self.concurrency_limit = concurrency_limit
+        # Number of connections opened to the best ranked host when the client is built,
+        # at most max_idle_connections of them are kept in the pool.
+        self.prewarm_connections = prewarm_connections
+        # If enabled, the heartbeat keeps a live connection to the best ranked host and the next one,
+        # so that a failover does not pay the handshakes. It is implied by keep_alive, which pings all hosts.
+        self.warm_standby = warm_standby
+        # Sends the requests of the blocking HTTPClient, RequestsTransport with max_idle_connections by default.
+        # Urllib3Transport saves the per-request CPU cost of requests. The transport is closed by HTTPClient.shutdown.
+        self.transport = transport
 
 
-class _HTTPCaller(object):
+class _BaseHTTPCaller(object):
+    # Holds everything shared by the blocking and the asyncio callers:
+    # request encoding, headers, auth signing and response decoding.
+    # Subclasses only implement the network I/O.
     def __init__(self,
                  project_id: str,
                  tenant_id: str,
@@ -47,7 +107,9 @@ class _HTTPCaller(object):
                  caller_config: Config,
                  schema: str,
                  keep_alive: bool,
-                 credential: _Credential = None):
+                 credential: _Credential = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 rate_limiters: Optional[Dict[str, RateLimiter]] = None):
         self._project_id = project_id
         self._tenant_id: str = tenant_id
         self._air_auth_token: Optional[str] = air_auth_token
@@ -56,42 +118,26 @@ class _HTTPCaller(object):
         self._schema = schema
         self._keep_alive = keep_alive
         self._credential: Optional[_Credential] = credential
-        # requests.post creates a new connection for each request, and cannot reuse the connection.
-        # Change it to session mode. By default, it maintains a connection pool of up to 10 different hosts.
-        self._http_cli: Session = requests.Session()
-        self._http_cli.mount("https://", HTTPAdapter(pool_maxsize=self._config.max_idle_connections))
-        self._http_cli.mount("http://", HTTPAdapter(pool_maxsize=self._config.max_idle_connections))
-        self._local = threading.local()
-        self._cancel = None
-        if self._keep_alive:
-            self._init_heartbeat_executor()
-
-    def _get_req_id(self) -> str:
-        return self._local.req_id
+        self._retry_policy: Optional[RetryPolicy] = retry_policy
+        self._hedge_budget = _RatioBudget(caller_config.hedge_budget_ratio, _HEDGE_BUDGET_MAX_TOKENS)
+        self._path_latencies: Dict[str, _LatencyWindow] = {}
+        self._url_metric_handles: Dict[str, _URLMetricHandles] = {}
+        self._concurrency_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+        # path -> limiter, the limiter of the empty path applies to all the paths
+        self._rate_limiters: Dict[str, RateLimiter] = rate_limiters or {}
 
-    def _init_heartbeat_executor(self):
-        self._cancel = utils.time_schedule(self._heartbeat, self._config.keep_alive_ping_interval_seconds)
-
-    def _heartbeat(self):
-        for host in self._host_availabler.get_hosts():
-            metrics_tags = [
-                "from:http_caller",
-                "project_id:" + self._project_id,
-                "host:" + utils.escape_metrics_tag_value(host)
-            ]
-            Metrics.counter(constant.METRICS_KEY_HEARTBEAT_COUNT, 1, *metrics_tags)
-            utils.ping(self._project_id, self._http_cli, _DEFAULT_PING_URL_FORMAT,
-                       self._schema, host, _DEFAULT_PING_TIMEOUT_SECONDS)
+    @staticmethod
+    def _get_req_id() -> str:
+        return _request_id_ctx.get()
 
-    def do_json_request(self, url: str, request: Union[dict, list], *opts: Option) -> Union[dict, list]:
-        options: Options = Option.conv_to_options(opts)
+    def _encode_json_request(self, request: Union[dict, list]) -> bytes:
         try:
             req_str: str = json.dumps(request)
         except BaseException as e:
             raise BizException(str(e))
-        req_bytes: bytes = req_str.encode("utf-8")
-        content_type: str = "application/json"
-        rsp_bytes = self._do_request(url, req_bytes, content_type, options)
+        return req_str.encode("utf-8")
+
+    def _decode_json_response(self, url: str, rsp_bytes: bytes) -> Union[dict, list]:
         try:
             rsp = json.loads(rsp_bytes)
         except BaseException as e:
@@ -106,11 +152,7 @@ class _HTTPCaller(object):
             raise BizException(str(e))
         return rsp
 
-    def do_pb_request(self, url: str, request: Message, response: Message, *opts: Option):
-        options: Options = Option.conv_to_options(opts)
-        req_bytes: bytes = request.SerializeToString()
-        content_type: str = "application/x-protobuf"
-        rsp_bytes = self._do_request(url, req_bytes, content_type, options)
+    def _decode_pb_response(self, url: str, rsp_bytes: bytes, response: Message):
         try:
             response.ParseFromString(rsp_bytes)
         except BaseException as e:
@@ -125,13 +167,254 @@ class _HTTPCaller(object):
             log.error("[ByteplusSDK] parse response fail, url:%s e:%s", url, e)
             raise BizException("parse response fail")
 
-    def _do_request(self, url: str, req_bytes: bytes, content_type: str, options: Options) -> Optional[bytes]:
-        req_bytes: bytes = gzip.compress(req_bytes)
-        headers: dict = self._build_headers(options, content_type)
+    # Resolves the options once for the requests sharing them, see RequestProfile.
+    def new_request_profile(self, *opts: Option) -> RequestProfile:
+        options: Options = Option.conv_to_options(opts)
+        if options.request_id is not None:
+            raise BizException("request profile cannot have a request id, it is shared by requests")
+        if options.deadline is not None:
+            raise BizException("request profile cannot have a deadline, pass Option.with_deadline with it instead")
+        options.query_string = self._build_query_string(options)
+        options.header_templates = {
+            content_type: self._build_header_template(options, content_type)
+            for content_type in (_CONTENT_TYPE_JSON, _CONTENT_TYPE_PB)
+        }
+        return RequestProfile(options)
+
+    # req_bytes should be gzip compressed.
+    # request_id is given when the request is sent again, otherwise it comes from the options or is generated.
+    def _build_request(self, url: str, req_bytes: bytes, content_type: str, options: Options,
+                       request_id: Optional[str] = None) -> HTTPRequest:
+        headers: dict = self._build_headers(options, content_type, request_id)
         url = self._build_url_with_queries(options, url)
-        return self._do_http_request(url, headers, req_bytes, options)
+        req = HTTPRequest(headers, url, constant.POST_METHOD_NAME, req_bytes)
+        self._with_auth_headers(req)
+        return req
+
+    # Called right before sending, after waiting for the limiters, so that the server gets the time really left.
+    # Timeout-Millis is not signed, so it can be set after signing.
+    def _with_deadline_headers(self, headers: dict, options: Options, host: str):
+        if options.deadline is None:
+            return
+        # leave the network round trip out of the time the server may spend
+        server_timeout_ms = int(self._remaining_seconds(options) * 1000 - self._host_availabler.get_rtt_millis(host))
+        if server_timeout_ms <= 0:
+            raise DeadlineExceededException("deadline exceeded before sending request, host:{}".format(host))
+        if "Timeout-Millis" in headers:
+            server_timeout_ms = min(server_timeout_ms, int(headers["Timeout-Millis"]))
+        headers["Timeout-Millis"] = str(server_timeout_ms)
+
+    # seconds left before the deadline, None if there is no deadline
+    @staticmethod
+    def _remaining_seconds(options: Options) -> Optional[float]:
+        if options.deadline is None:
+            return None
+        return options.deadline - time.monotonic()
+
+    # whether a request sent to host after delay_seconds can still finish before the deadline
+    def _has_time_for_attempt(self, options: Options, host: str, delay_seconds: float = 0) -> bool:
+        remaining = self._remaining_seconds(options)
+        if remaining is None:
+            return True
+        return remaining - delay_seconds > self._host_availabler.get_rtt_millis(host) / 1000
+
+    # timeout of one attempt, the smaller of the option timeout and the time left before the deadline
+    def _attempt_timeout_seconds(self, options: Options) -> Optional[float]:
+        remaining = self._remaining_seconds(options)
+        if remaining is None:
+            if options.timeout is None:
+                return None
+            return options.timeout.total_seconds()
+        if remaining <= 0:
+            raise DeadlineExceededException("deadline exceeded before sending request")
+        if options.timeout is None:
+            return remaining
+        return min(options.timeout.total_seconds(), remaining)
+
+    def _get_concurrency_limiter(self, host: str) -> Optional[AdaptiveConcurrencyLimiter]:
+        if self._config.concurrency_limit is None:
+            return None
+        limiter = self._concurrency_limiters.get(host)
+        if limiter is None:
+            limiter = self._concurrency_limiters.setdefault(
+                host, AdaptiveConcurrencyLimiter(self._config.concurrency_limit))
+        return limiter
+
+    def _concurrency_queue_wait_seconds(self, options: Options) -> float:
+        wait_seconds = self._config.concurrency_limit.max_queue_wait_seconds
+        remaining = self._remaining_seconds(options)
+        if remaining is not None:
+            wait_seconds = min(wait_seconds, max(0.0, remaining))
+        return wait_seconds
+
+    def _report_concurrency_acquire(self, url: str, host: str, limiter: AdaptiveConcurrencyLimiter,
+                                    acquired: bool, wait_ms: int):
+        if Metrics.is_enabled():
+            metrics_tags = [
+                "project_id:" + self._project_id,
+                "host:" + utils.escape_metrics_tag_value(host),
+            ]
+            if wait_ms > 0:
+                Metrics.timer(constant.METRICS_KEY_CONCURRENCY_QUEUE_COST, wait_ms, *metrics_tags)
+            Metrics.store(constant.METRICS_KEY_CONCURRENCY_LIMIT, limiter.limit, *metrics_tags)
+            Metrics.store(constant.METRICS_KEY_CONCURRENCY_IN_FLIGHT, limiter.in_flight, *metrics_tags)
+            if not acquired:
+                Metrics.counter(constant.METRICS_KEY_CONCURRENCY_REJECT, 1, *metrics_tags)
+        if acquired:
+            return
+        MetricsLog.warn(self._get_req_id(),
+                        "[ByteplusSDK] reject request by concurrency limit, project_id:{}, url:{}, limit:{}",
+                        self._project_id, url, limiter.limit)
+        log.warning("[ByteplusSDK] reject request by concurrency limit, url:%s, limit:%d", url, limiter.limit)
+        raise ConcurrencyLimitException("concurrency limit {} of host {} is reached".format(limiter.limit, host))
+
+    def _get_rate_limiters(self, path: str) -> List[RateLimiter]:
+        if len(self._rate_limiters) == 0:
+            return []
+        return [limiter for limiter in (self._rate_limiters.get(""), self._rate_limiters.get(path))
+                if limiter is not None]
+
+    def _rate_limit_wait_seconds(self, limiter: RateLimiter, options: Options) -> Optional[float]:
+        wait_seconds = limiter.max_wait_seconds
+        remaining = self._remaining_seconds(options)
+        if remaining is not None:
+            remaining = max(0.0, remaining)
+            wait_seconds = remaining if wait_seconds is None else min(wait_seconds, remaining)
+        return wait_seconds
+
+    def _report_rate_limit_acquire(self, url: str, acquired: bool, wait_ms: int):
+        if acquired and (wait_ms <= 0 or not Metrics.is_enabled()):
+            return
+        metrics_tags = [
+            "project_id:" + self._project_id,
+            "url:" + utils.escape_metrics_tag_value(url),
+        ]
+        if wait_ms > 0:
+            Metrics.timer(constant.METRICS_KEY_RATE_LIMIT_WAIT_COST, wait_ms, *metrics_tags)
+        if acquired:
+            return
+        Metrics.counter(constant.METRICS_KEY_RATE_LIMIT_REJECT, 1, *metrics_tags)
+        log.warning("[ByteplusSDK] reject request by rate limit, url:%s", url)
+        raise RateLimitException("rate limit of {} is reached".format(url))
+
+    # Slows the rate limiters down when the server rejects requests by quota, and lets them ramp back up after.
+    def _feedback_rate_limiters(self, limiters: List[RateLimiter], url: str, status_code: int, headers):
+        if len(limiters) == 0:
+            return
+        if status_code != constant.STATUS_CODE_TOO_MANY_REQUEST:
+            for limiter in limiters:
+                limiter.on_success()
+            return
+        retry_after = utils.parse_retry_after(headers.get("Retry-After"))
+        for limiter in limiters:
+            if not limiter.on_throttled(retry_after):
+                continue
+            metrics_tags = [
+                "project_id:" + self._project_id,
+                "url:" + utils.escape_metrics_tag_value(url),
+            ]
+            Metrics.store(constant.METRICS_KEY_RATE_LIMIT_RATE, limiter.rate, *metrics_tags)
+            MetricsLog.warn(self._get_req_id(),
+                            "[ByteplusSDK] lower rate limit by server throttling, project_id:{}, url:{}, rate:{}",
+                            self._project_id, url, limiter.rate)
+
+    def _heartbeat_enabled(self) -> bool:
+        return self._keep_alive or self._config.warm_standby
+
+    def _heartbeat_hosts(self) -> List[str]:
+        if self._keep_alive:
+            return self._host_availabler.get_hosts()
+        # warm standby only, the best ranked host and the failover host
+        return self._host_availabler.get_ranked_hosts("*")[:2]
+
+    # Returns the host to pre-warm and the number of connections to open, the host is None if nothing to do.
+    def _prewarm_target(self) -> Tuple[Optional[str], int]:
+        count = min(self._config.prewarm_connections, self._config.max_idle_connections)
+        if count <= 0:
+            return None, 0
+        hosts = self._host_availabler.get_ranked_hosts("*")
+        if len(hosts) == 0:
+            return None, 0
+        metrics_tags = [
+            "from:prewarm",
+            "project_id:" + self._project_id,
+            "host:" + utils.escape_metrics_tag_value(hosts[0])
+        ]
+        Metrics.counter(constant.METRICS_KEY_HEARTBEAT_COUNT, count, *metrics_tags)
+        return hosts[0], count
+
+    def _hedge_delay_seconds(self, url: str, options: Options) -> float:
+        if options.hedge_delay is not None:
+            return options.hedge_delay.total_seconds()
+        latency_window = self._path_latencies.get(urlparse(url).path)
+        if latency_window is None:
+            return _DEFAULT_HEDGE_DELAY_SECONDS
+        latency = latency_window.percentile(_HEDGE_DELAY_PERCENTILE, _PATH_LATENCY_MIN_SAMPLES)
+        if latency is None:
+            return _DEFAULT_HEDGE_DELAY_SECONDS
+        return latency / 1000
+
+    # Builds the hedged request sent to the next ranked host,
+    # returns None if there is no other host or the hedge budget is used up.
+    def _new_hedge_request(self, url: str, req: HTTPRequest, req_bytes: bytes, content_type: str,
+                           options: Options) -> Optional[HTTPRequest]:
+        parse_result = urlparse(url)
+        backup_host = self._host_availabler.get_backup_host(parse_result.path, parse_result.netloc)
+        if backup_host is None:
+            self._report_hedge(url, "no_backup_host")
+            return None
+        if not self._has_time_for_attempt(options, backup_host):
+            self._report_hedge(url, "deadline_exceeded")
+            return None
+        if not self._hedge_budget.try_spend():
+            self._report_hedge(url, "budget_exhausted")
+            return None
+        self._report_hedge(url, "sent")
+        backup_url = utils.build_url(self._schema, backup_host, parse_result.path)
+        return self._rebuild_request(backup_url, req, req_bytes, content_type, options)
+
+    # Builds the request sent again after a failure, to the next best host if there is one.
+    # Returns the new url together with the request.
+    def _new_retry_request(self, url: str, req: HTTPRequest, req_bytes: bytes, content_type: str,
+                           options: Options) -> Tuple[str, HTTPRequest]:
+        parse_result = urlparse(url)
+        host = self._host_availabler.get_backup_host(parse_result.path, parse_result.netloc)
+        if host is None:
+            host = parse_result.netloc
+        retry_url = utils.build_url(self._schema, host, parse_result.path)
+        return retry_url, self._rebuild_request(retry_url, req, req_bytes, content_type, options)
+
+    def _rebuild_request(self, url: str, req: HTTPRequest, req_bytes: bytes, content_type: str,
+                         options: Options) -> HTTPRequest:
+        # the server deduplicates by request id, so the request must keep it.
+        # signatures cover the host and the timestamp, so they are computed again.
+        return self._build_request(url, req_bytes, content_type, options, req.header["Request-Id"])
+
+    def _retry_metrics_tags(self, url: str) -> List[str]:
+        return [
+            "project_id:" + self._project_id,
+            "url:" + utils.escape_metrics_tag_value(url),
+        ]
 
-    def _build_headers(self, options: Options, content_type: str) -> dict:
+    def _report_hedge(self, url: str, hedge_type: str):
+        metrics_tags = [
+            "type:" + hedge_type,
+            "project_id:" + self._project_id,
+            "url:" + utils.escape_metrics_tag_value(url),
+        ]
+        Metrics.counter(constant.METRICS_KEY_REQUEST_HEDGE, 1, *metrics_tags)
+
+    def _build_headers(self, options: Options, content_type: str, request_id: Optional[str] = None) -> dict:
+        header_templates = options.header_templates
+        if header_templates is not None and content_type in header_templates:
+            headers = dict(header_templates[content_type])
+        else:
+            headers = self._build_header_template(options, content_type)
+        self._with_request_id_header(headers, request_id or options.request_id)
+        return headers
+
+    # headers which are the same for all the requests with the options
+    def _build_header_template(self, options: Options, content_type: str) -> dict:
         headers = {
             "Content-Encoding": "gzip",
             # The 'requests' lib support '"Content-Encoding": "gzip"' header,
@@ -142,89 +425,37 @@ class _HTTPCaller(object):
             "Tenant-Id": self._tenant_id,
             "Project-Id": self._project_id,
         }
-        self._with_options_headers(headers, options)
-        return headers
-
-    def _with_options_headers(self, headers: dict, options: Options):
         if options.headers is not None:
             headers.update(options.headers)
-        request_id: str = options.request_id
+        if options.server_timeout is not None:
+            headers["Timeout-Millis"] = str(_milliseconds(options.server_timeout))
+        return headers
+
+    @staticmethod
+    def _with_request_id_header(headers: dict, request_id: Optional[str]):
         if request_id is None or len(request_id) == 0:
             request_id = str(uuid.uuid1())
             log.info("[ByteplusSDK] requestID is generated by sdk: '%s'", request_id)
         headers["Request-Id"] = request_id
-        self._local.req_id = request_id
-        if options.server_timeout is not None:
-            headers["Timeout-Millis"] = str(_milliseconds(options.server_timeout))
+        _request_id_ctx.set(request_id)
 
     @staticmethod
-    def _build_url_with_queries(options: Options, url: str):
-        queries = {}
-        if options.queries is not None:
-            queries.update(options.queries)
-        if len(queries) == 0:
+    def _build_query_string(options: Options) -> str:
+        if options.queries is None or len(options.queries) == 0:
+            return ""
+        return "&".join([query_name + "=" + query_value for query_name, query_value in options.queries.items()])
+
+    @classmethod
+    def _build_url_with_queries(cls, options: Options, url: str):
+        query_string = options.query_string
+        if query_string is None:
+            query_string = cls._build_query_string(options)
+        if len(query_string) == 0:
             return url
-        query_parts = []
-        for query_name in queries.keys():
-            query_parts.append(query_name + "=" + queries[query_name])
-        query_string = "&".join(query_parts)
         if "?" in url:
             return url + "&" + query_string
         return url + "?" + query_string
 
-    def _do_http_request(self, url: str, headers: dict, req_bytes: bytes, options: Options) -> Optional[bytes]:
-        req = HTTPRequest(headers, url, constant.POST_METHOD_NAME, req_bytes)
-        self._with_auth_headers(req)
-        start = time.time()
-        log.debug("[ByteplusSDK][HTTPCaller] URL:%s, Request Headers:\n%s", url, str(headers))
-        try:
-            if options.timeout is not None:
-                timeout_secs = options.timeout.total_seconds()
-                rsp: Response = self._http_cli.post(url=req.url, headers=req.header, data=req.req_bytes,
-                                                    timeout=timeout_secs)
-            else:
-                rsp: Response = self._http_cli.post(url=url, headers=headers, data=req_bytes)
-            if rsp.status_code != constant.HTTP_STATUS_OK:
-                self._log_err_http_rsp(url, rsp)
-                raise BizException("code:{} msg:{}".format(rsp.status_code, rsp.reason))
-        except BaseException as e:
-            cost = int((time.time() - start) * 1000)
-            if self._is_timeout_exception(e):
-                metrics_tags = [
-                    "type:request_timeout"
-                    "project_id:" + self._project_id,
-                    "url:" + utils.escape_metrics_tag_value(url),
-                ]
-                Metrics.counter(constant.METRICS_KEY_COMMON_ERROR, 1, *metrics_tags)
-                MetricsLog.error(self._get_req_id(),
-                                 "[ByteplusSDK] do http request timeout, project_id:{}, url:{}, cost:{}ms, msg:{}",
-                                 self._project_id, url, cost, e)
-                log.error("[ByteplusSDK] do http request timeout, url:%s, cost:%dms, msg:%s", url, cost, e)
-                raise NetException(str(e))
-            metrics_tags = [
-                "type:request_occur_exception"
-                "project_id:" + self._project_id,
-                "url:" + utils.escape_metrics_tag_value(url),
-            ]
-            Metrics.counter(constant.METRICS_KEY_COMMON_ERROR, 1, *metrics_tags)
-            MetricsLog.error(self._get_req_id(),
-                             "[ByteplusSDK] do http request occur exception, project_id:{}, url:{}, msg:{}",
-                             self._project_id, url, e)
-            log.error("[ByteplusSDK] do http request occur io exception, url:%s, cost:%dms, msg:%s", url, cost, e)
-            raise BizException(str(e))
-        finally:
-            cost = int((time.time() - start) * 1000)
-            metrics_tags = [
-                "project_id:" + self._project_id,
-                "url:" + utils.escape_metrics_tag_value(url),
-            ]
-            Metrics.timer(constant.METRICS_KEY_REQUEST_TOTAL_COST, cost, *metrics_tags)
-            Metrics.counter(constant.METRICS_KEY_REQUEST_COUNT, 1, *metrics_tags)
-            MetricsLog.info(self._get_req_id(), "[ByteplusSDK] http request, project_id:{}, url:{}, cost:{}ms",
-                            self._project_id, url, cost)
-            log.debug("[ByteplusSDK] http url:%s, cost:%dms", url, cost)
-        return rsp.content
-
     def _with_auth_headers(self, req: HTTPRequest):
         if self._credential is None:
             self._with_air_auth_headers(req)
@@ -248,27 +479,77 @@ class _HTTPCaller(object):
         sha256.update(nonce.encode('utf-8'))
         return sha256.hexdigest()
 
-    def _log_err_http_rsp(self, url: str, rsp: Response) -> None:
+    def _report_request_exception(self, url: str, e: BaseException, cost: int, is_timeout: bool):
+        if is_timeout:
+            metrics_tags = [
+                "type:request_timeout",
+                "project_id:" + self._project_id,
+                "url:" + utils.escape_metrics_tag_value(url),
+            ]
+            Metrics.counter(constant.METRICS_KEY_COMMON_ERROR, 1, *metrics_tags)
+            MetricsLog.error(self._get_req_id(),
+                             "[ByteplusSDK] do http request timeout, project_id:{}, url:{}, cost:{}ms, msg:{}",
+                             self._project_id, url, cost, e)
+            log.error("[ByteplusSDK] do http request timeout, url:%s, cost:%dms, msg:%s", url, cost, e)
+            return
+        metrics_tags = [
+            "type:request_occur_exception",
+            "project_id:" + self._project_id,
+            "url:" + utils.escape_metrics_tag_value(url),
+        ]
+        Metrics.counter(constant.METRICS_KEY_COMMON_ERROR, 1, *metrics_tags)
+        MetricsLog.error(self._get_req_id(),
+                         "[ByteplusSDK] do http request occur exception, project_id:{}, url:{}, msg:{}",
+                         self._project_id, url, e)
+        log.error("[ByteplusSDK] do http request occur io exception, url:%s, cost:%dms, msg:%s", url, cost, e)
+
+    def _report_request_finish(self, url: str, host: str, path: str, cost: int, host_ok: bool):
+        # host_ok is False when the host did not serve the request, such as network errors and 5xx
+        self._host_availabler.report_request_result(host, host_ok, cost)
+        latency_window = self._path_latencies.get(path)
+        if latency_window is None:
+            latency_window = self._path_latencies.setdefault(path, _LatencyWindow(_PATH_LATENCY_WINDOW_SIZE))
+        latency_window.put(cost)
+        if Metrics.is_enabled():
+            metric_handles = self._get_url_metric_handles(url)
+            metric_handles.request_total_cost.record(cost)
+            metric_handles.request_count.inc(1)
+        if MetricsLog.is_enabled():
+            MetricsLog.info(self._get_req_id(), "[ByteplusSDK] http request, project_id:{}, url:{}, cost:{}ms",
+                            self._project_id, url, cost)
+        log.debug("[ByteplusSDK] http url:%s, cost:%dms", url, cost)
+
+    def _get_url_metric_handles(self, url: str) -> _URLMetricHandles:
+        metric_handles = self._url_metric_handles.get(url)
+        if metric_handles is not None:
+            return metric_handles
+        if len(self._url_metric_handles) >= _MAX_URL_METRIC_HANDLES:
+            self._url_metric_handles = {}
+        metric_handles = _URLMetricHandles(self._project_id, url)
+        self._url_metric_handles[url] = metric_handles
+        return metric_handles
+
+    def _log_err_http_rsp(self, url: str, status_code: int, reason: str, headers, rsp_bytes: Optional[bytes]) -> None:
         metrics_tags = [
-            "type:rsp_status_not_ok"
+            "type:rsp_status_not_ok",
             "project_id:" + self._project_id,
             "url:" + utils.escape_metrics_tag_value(url),
-            "status:" + str(rsp.status_code)
+            "status:" + str(status_code)
         ]
         Metrics.counter(constant.METRICS_KEY_COMMON_ERROR, 1, *metrics_tags)
-        rsp_bytes = rsp.content
-        if rsp_bytes is not None and len(rsp.content) > 0:
+        if rsp_bytes is not None and len(rsp_bytes) > 0:
             MetricsLog.error(self._get_req_id(),
                              "[ByteplusSDK] http status not 200, project_id:{}, url:{}, code:{}, msg:{}, headers:\n{}, "
                              "body:\n{}",
-                             self._project_id, url, rsp.status_code, rsp.reason, str(rsp.headers), str(rsp_bytes))
+                             self._project_id, url, status_code, reason, headers, rsp_bytes)
             log.error("[ByteplusSDK] http status not 200, url:%s code:%d msg:%s headers:\n%s body:\n%s",
-                      url, rsp.status_code, rsp.reason, str(rsp.headers), str(rsp_bytes))
+                      url, status_code, reason, headers, rsp_bytes)
         else:
-            MetricsLog.error(self._get_req_id(), "[ByteplusSDK] http status not 200, project_id:{}, url:{}, code:{}, msg:{}, headers:\n{}",
-                             self._project_id, url, rsp.status_code, rsp.reason, str(rsp.headers))
+            MetricsLog.error(self._get_req_id(), "[ByteplusSDK] http status not 200, project_id:{}, url:{}, code:{}, "
+                                                 "msg:{}, headers:\n{}",
+                             self._project_id, url, status_code, reason, headers)
             log.error("[ByteplusSDK] http status not 200, url:%s code:%d msg:%s headers:\n%s",
-                      url, rsp.status_code, rsp.reason, str(rsp.headers))
+                      url, status_code, reason, headers)
         return
 
     @staticmethod
@@ -278,6 +559,218 @@ class _HTTPCaller(object):
             return True
         return False
 
+
+class _HTTPCaller(_BaseHTTPCaller):
+    def __init__(self,
+                 project_id: str,
+                 tenant_id: str,
+                 air_auth_token: str,
+                 host_availabler: AbstractHostAvailabler,
+                 caller_config: Config,
+                 schema: str,
+                 keep_alive: bool,
+                 credential: _Credential = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 rate_limiters: Optional[Dict[str, RateLimiter]] = None):
+        super().__init__(project_id, tenant_id, air_auth_token, host_availabler,
+                         caller_config, schema, keep_alive, credential, retry_policy, rate_limiters)
+        self._transport: Transport = self._config.transport
+        if self._transport is None:
+            self._transport = RequestsTransport(self._config.max_idle_connections)
+        self._cancel = None
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+        self._hedge_executor_lock = threading.Lock()
+        # a hedge holds a slot from its submission, so it is only submitted when a worker is free
+        self._hedge_slots = threading.BoundedSemaphore(max(1, self._config.hedge_max_workers))
+        self._prewarm()
+        if self._heartbeat_enabled():
+            self._init_heartbeat_executor()
+
+    # Opens the connections concurrently in the background, sequential pings would reuse one connection.
+    def _prewarm(self):
+        host, count = self._prewarm_target()
+        if host is None:
+            return
+        executor = ThreadPoolExecutor(max_workers=count, thread_name_prefix="byteplus-rec-prewarm")
+        for _ in range(count):
+            executor.submit(utils.ping, self._project_id, self._transport, _DEFAULT_PING_URL_FORMAT,
+                            self._schema, host, _DEFAULT_PING_TIMEOUT_SECONDS)
+        executor.shutdown(wait=False)
+
+    def _init_heartbeat_executor(self):
+        self._cancel = utils.time_schedule(self._heartbeat, self._config.keep_alive_ping_interval_seconds,
+                                           "heartbeat")
+
+    def _heartbeat(self):
+        for host in self._heartbeat_hosts():
+            metrics_tags = [
+                "from:http_caller",
+                "project_id:" + self._project_id,
+                "host:" + utils.escape_metrics_tag_value(host)
+            ]
+            Metrics.counter(constant.METRICS_KEY_HEARTBEAT_COUNT, 1, *metrics_tags)
+            utils.ping(self._project_id, self._transport, _DEFAULT_PING_URL_FORMAT,
+                       self._schema, host, _DEFAULT_PING_TIMEOUT_SECONDS)
+
+    def do_json_request(self, url: str, request: Union[dict, list], *opts: Option) -> Union[dict, list]:
+        options: Options = Option.conv_to_options(opts)
+        req_bytes: bytes = self._encode_json_request(request)
+        content_type: str = _CONTENT_TYPE_JSON
+        rsp_bytes = self._do_request(url, req_bytes, content_type, options)
+        return self._decode_json_response(url, rsp_bytes)
+
+    def do_pb_request(self, url: str, request: Message, response: Message, *opts: Option):
+        options: Options = Option.conv_to_options(opts)
+        req_bytes: bytes = request.SerializeToString()
+        content_type: str = _CONTENT_TYPE_PB
+        rsp_bytes = self._do_request(url, req_bytes, content_type, options)
+        self._decode_pb_response(url, rsp_bytes, response)
+
+    def _do_request(self, url: str, req_bytes: bytes, content_type: str, options: Options) -> Optional[bytes]:
+        req_bytes: bytes = gzip.compress(req_bytes)
+        req: HTTPRequest = self._build_request(url, req_bytes, content_type, options)
+        if self._retry_policy is None:
+            return self._do_attempt(url, req, req_bytes, content_type, options)
+        self._retry_policy.on_request()
+        retry_times = 0
+        while True:
+            try:
+                return self._do_attempt(url, req, req_bytes, content_type, options)
+            except BaseException as e:
+                if not self._retry_policy.is_retryable(e):
+                    raise
+                backoff = self._retry_policy.next_backoff_seconds(e, retry_times, *self._retry_metrics_tags(url))
+                if backoff is None:
+                    raise
+                if not self._has_time_for_attempt(options, urlparse(url).netloc, backoff):
+                    log.warning("[ByteplusSDK] deadline is too close to retry, url:%s, err:%s", url, e)
+                    raise
+                log.warning("[ByteplusSDK] retry request after %.3fs, url:%s, err:%s", backoff, url, e)
+            time.sleep(backoff)
+            retry_times += 1
+            url, req = self._new_retry_request(url, req, req_bytes, content_type, options)
+
+    def _do_attempt(self, url: str, req: HTTPRequest, req_bytes: bytes, content_type: str,
+                    options: Options) -> Optional[bytes]:
+        if options.hedge:
+            return self._do_hedged_http_request(url, req, req_bytes, content_type, options)
+        return self._do_http_request(req, options)
+
+    # The primary request runs on the calling thread, only the hedge runs on the hedge pool, and it is skipped
+    # when the pool is busy, so that neither queues behind the other under load.
+    # A blocking request can not be interrupted, so the response of the hedge is used when the primary fails,
+    # such as timing out.
+    def _do_hedged_http_request(self, url: str, req: HTTPRequest, req_bytes: bytes, content_type: str,
+                                options: Options) -> Optional[bytes]:
+        self._hedge_budget.deposit()
+        primary_done = threading.Event()
+        hedge: Optional[Future] = self._submit_hedge(url, req, req_bytes, content_type, options, primary_done)
+        try:
+            rsp_bytes = self._do_http_request(req, options)
+        except BaseException:
+            primary_done.set()
+            if hedge is None:
+                raise
+            try:
+                hedge_rsp_bytes = hedge.result()
+            except BaseException:
+                hedge_rsp_bytes = _HEDGE_NOT_SENT
+            if hedge_rsp_bytes is _HEDGE_NOT_SENT:
+                raise
+            self._report_hedge(url, "won")
+            return hedge_rsp_bytes
+        primary_done.set()
+        return rsp_bytes
+
+    # returns None if the hedge pool is busy
+    def _submit_hedge(self, url: str, req: HTTPRequest, req_bytes: bytes, content_type: str, options: Options,
+                      primary_done: threading.Event) -> Optional[Future]:
+        if not self._hedge_slots.acquire(blocking=False):
+            self._report_hedge(url, "pool_busy")
+            return None
+        try:
+            # run in a copied context so that the metrics logs of the worker keep the request id
+            return self._get_hedge_executor().submit(contextvars.copy_context().run, self._do_hedge,
+                                                     url, req, req_bytes, content_type, options, primary_done)
+        except BaseException:
+            self._hedge_slots.release()
+            raise
+
+    # waits for the hedge delay on the hedge pool, and sends the hedge if the primary request is not done
+    def _do_hedge(self, url: str, req: HTTPRequest, req_bytes: bytes, content_type: str, options: Options,
+                  primary_done: threading.Event):
+        try:
+            if primary_done.wait(self._hedge_delay_seconds(url, options)):
+                return _HEDGE_NOT_SENT
+            hedge_req: Optional[HTTPRequest] = self._new_hedge_request(url, req, req_bytes, content_type, options)
+            if hedge_req is None:
+                return _HEDGE_NOT_SENT
+            return self._do_http_request(hedge_req, options)
+        finally:
+            self._hedge_slots.release()
+
+    def _get_hedge_executor(self) -> ThreadPoolExecutor:
+        if self._hedge_executor is None:
+            with self._hedge_executor_lock:
+                if self._hedge_executor is None:
+                    self._hedge_executor = ThreadPoolExecutor(max_workers=self._config.hedge_max_workers,
+                                                              thread_name_prefix="byteplus-rec-hedge")
+        return self._hedge_executor
+
+    def _do_http_request(self, req: HTTPRequest, options: Options) -> Optional[bytes]:
+        url: str = req.url
+        parse_result = urlparse(url)
+        host: str = parse_result.netloc
+        rate_limiters: List[RateLimiter] = self._get_rate_limiters(parse_result.path)
+        for rate_limiter in rate_limiters:
+            wait_start = time.time()
+            acquired = rate_limiter.acquire(self._rate_limit_wait_seconds(rate_limiter, options))
+            self._report_rate_limit_acquire(url, acquired, int((time.time() - wait_start) * 1000))
+        limiter: Optional[AdaptiveConcurrencyLimiter] = self._get_concurrency_limiter(host)
+        if limiter is not None:
+            wait_start = time.time()
+            acquired = limiter.acquire(self._concurrency_queue_wait_seconds(options))
+            self._report_concurrency_acquire(url, host, limiter, acquired, int((time.time() - wait_start) * 1000))
+        try:
+            # the limiters may have waited, so the time left is only known now
+            timeout = self._attempt_timeout_seconds(options)
+            self._with_deadline_headers(req.header, options, host)
+        except DeadlineExceededException:
+            # the request is not sent, it says nothing about the host
+            if limiter is not None:
+                limiter.release_without_feedback()
+            raise
+        self._host_availabler.report_request_start(host)
+        host_ok = False
+        start = time.time()
+        log.debug("[ByteplusSDK][HTTPCaller] URL:%s, Request Headers:\n%s", url, req.header)
+        try:
+            rsp = self._transport.post(req.url, req.header, req.req_bytes, timeout)
+            host_ok = rsp.status_code < constant.HTTP_STATUS_INTERNAL_SERVER_ERROR
+            self._feedback_rate_limiters(rate_limiters, url, rsp.status_code, rsp.headers)
+            if rsp.status_code != constant.HTTP_STATUS_OK:
+                self._log_err_http_rsp(url, rsp.status_code, rsp.reason, rsp.headers, rsp.content)
+                raise StatusException("code:{} msg:{}".format(rsp.status_code, rsp.reason), rsp.status_code,
+                                      utils.parse_retry_after(rsp.headers.get("Retry-After")))
+        except BaseException as e:
+            cost = int((time.time() - start) * 1000)
+            if self._is_timeout_exception(e):
+                self._report_request_exception(url, e, cost, True)
+                raise NetException(str(e))
+            self._report_request_exception(url, e, cost, False)
+            if isinstance(e, StatusException):
+                raise
+            raise BizException(str(e))
+        finally:
+            cost = int((time.time() - start) * 1000)
+            if limiter is not None:
+                limiter.release(host_ok, cost)
+            self._report_request_finish(url, host, parse_result.path, cost, host_ok)
+        return rsp.content
+
     def shutdown(self):
         if self._cancel is not None:
             self._cancel()
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False)
+        self._transport.close()
@@ -1,16 +1,24 @@
 import threading
-from typing import Optional, Union, List
+from concurrent.futures import Future
+from typing import Optional, Union, List, Dict
 import logging
 
 from google.protobuf.message import Message
 
 from byteplus_rec_core.abtract_host_availabler import AbstractHostAvailabler
+from byteplus_rec_core.async_http_caller import _AsyncHTTPCaller
+from byteplus_rec_core.async_http_client import AsyncHTTPClient
+from byteplus_rec_core.circuit_breaker import CircuitBreakerConfig
 from byteplus_rec_core.host_availabler_factory import HostAvailablerFactory
+from byteplus_rec_core.host_selector import HostSelector
+from byteplus_rec_core.host_snapshot import HostSnapshotConfig
 from byteplus_rec_core.http_caller import Config as HTTPCallerConfig
 from byteplus_rec_core.http_caller import _HTTPCaller
 from byteplus_rec_core.metrics.metrics_collector import MetricsCollector
 from byteplus_rec_core.metrics.metrics_option import MetricsCfg
-from byteplus_rec_core.option import Option
+from byteplus_rec_core.option import Option, RequestProfile
+from byteplus_rec_core.rate_limiter import RateLimiter
+from byteplus_rec_core.retry_policy import RetryPolicy
 from byteplus_rec_core.abstract_region import AbstractRegion
 from byteplus_rec_core.auth import _Credential
 from byteplus_rec_core import utils
@@ -34,10 +42,20 @@ class HTTPClient(object):
     def do_json_request(self, path: str, request: Union[dict, list], *opts: Option) -> Union[dict, list]:
         return self._http_caller.do_json_request(self._build_url(path), request, *opts)
 
+    # Resolves the options once for the requests of a path, pass the profile as the only option of
+    # do_pb_request or do_json_request to skip building the same options and headers on every call.
+    def new_request_profile(self, *opts: Option) -> RequestProfile:
+        return self._http_caller.new_request_profile(*opts)
+
     def _build_url(self, path: str):
         host: str = self._host_availabler.get_host(path)
         return utils.build_url(self._schema, host, path)
 
+    # A future which is done when hosts are ranked by the first scoring round,
+    # wait on it with `client.ready().result(timeout)` if the client is built by non_blocking_build.
+    def ready(self) -> Future:
+        return self._host_availabler.ready()
+
     def shutdown(self):
         self._host_availabler.shutdown()
         self._http_caller.shutdown()
@@ -61,6 +79,12 @@ class _HTTPClientBuilder(object):
         self._caller_config: Optional[HTTPCallerConfig] = None
         self._host_availabler: Optional[AbstractHostAvailabler] = None
         self._metrics_cfg: Optional[MetricsCfg] = None
+        self._host_selector: Optional[HostSelector] = None
+        self._retry_policy: Optional[RetryPolicy] = None
+        self._rate_limiters: Dict[str, RateLimiter] = {}
+        self._circuit_breaker_config: Optional[CircuitBreakerConfig] = None
+        self._non_blocking_build: Optional[bool] = False
+        self._host_snapshot_config: Optional[HostSnapshotConfig] = None
 
     def tenant_id(self, tenant_id: str):
         self._tenant_id = tenant_id
@@ -114,6 +138,19 @@ class _HTTPClientBuilder(object):
         self._keep_alive = keep_alive
         return self
 
+    # If enabled, build() returns without pinging the hosts: requests use the configured host order
+    # (main_host first) until the first scoring round, which runs in the background, ranks the hosts.
+    # HTTPClient.ready() tells when it finishes.
+    def non_blocking_build(self, non_blocking_build: bool):
+        self._non_blocking_build = non_blocking_build
+        return self
+
+    # Persists the ping results of the hosts to a file, so that a new process ranks the hosts
+    # by what the previous one learned instead of treating all hosts as healthy.
+    def host_snapshot(self, host_snapshot_config: HostSnapshotConfig):
+        self._host_snapshot_config = host_snapshot_config
+        return self
+
     def caller_config(self, caller_config: HTTPCallerConfig):
         self._caller_config = caller_config
         return self
@@ -122,6 +159,29 @@ class _HTTPClientBuilder(object):
         self._metrics_cfg = metrics_cfg
         return self
 
+    # Decides which of the ranked hosts each request is sent to,
+    # by default all requests go to the best ranked host.
+    def host_selector(self, host_selector: HostSelector):
+        self._host_selector = host_selector
+        return self
+
+    # Retries failed requests inside HTTPClient, by default requests are not retried.
+    def retry_policy(self, retry_policy: RetryPolicy):
+        self._retry_policy = retry_policy
+        return self
+
+    # Stops sending requests to a host after consecutive failures until its pings succeed again,
+    # by default hosts are only ranked down by their failures.
+    def circuit_breaker(self, circuit_breaker_config: CircuitBreakerConfig):
+        self._circuit_breaker_config = circuit_breaker_config
+        return self
+
+    # Paces the requests of `path`, or of all the paths if path is None, to stay under the server quota.
+    # Share one RateLimiter between the clients of the same project to limit the project as a whole.
+    def rate_limiter(self, rate_limiter: RateLimiter, path: Optional[str] = None):
+        self._rate_limiters[path or ""] = rate_limiter
+        return self
+
     def build(self) -> HTTPClient:
         global _global_host_availabler
 
@@ -133,6 +193,20 @@ class _HTTPClientBuilder(object):
         MetricsCollector.init(self._metrics_cfg, _global_host_availabler)
         return HTTPClient(self._new_http_caller(), self._host_availabler, self._schema, self._project_id)
 
+    # Build an AsyncHTTPClient whose requests, host scoring and heartbeat run on asyncio,
+    # requires the optional dependency aiohttp.
+    def build_async(self) -> AsyncHTTPClient:
+        global _global_host_availabler
+
+        self._check_required_field()
+        self._fill_default(async_mode=True)
+        if not MetricsCollector.is_initialed() and self._metrics_cfg is not None:
+            if self._metrics_cfg.enable_metrics or self._metrics_cfg.enable_metrics_log:
+                self._init_global_host_availabler(async_mode=True)
+        MetricsCollector.init(self._metrics_cfg, _global_host_availabler)
+        return AsyncHTTPClient(self._new_http_caller(_AsyncHTTPCaller), self._host_availabler,
+                               self._schema, self._project_id)
+
     def _check_required_field(self):
         if self._tenant_id is None or len(self._tenant_id) == 0:
             raise Exception("tenant id is null")
@@ -149,28 +223,63 @@ class _HTTPClientBuilder(object):
         if utils.is_all_empty_str([self._auth_ak, self._auth_sk]):
             raise Exception("ak and sk cannot be null")
 
-    def _fill_default(self):
+    def _fill_default(self, async_mode: bool = False):
         if utils.is_empty_str(self._schema):
             self._schema = "https"
         # # fill hostAvailabler.
         if self._host_availabler_factory is None:
             self._host_availabler_factory = HostAvailablerFactory()
-        self._host_availabler: AbstractHostAvailabler = self._new_host_availabler()
+        if async_mode:
+            self._host_availabler: AbstractHostAvailabler = self._new_async_host_availabler()
+        else:
+            self._host_availabler: AbstractHostAvailabler = self._new_host_availabler()
+        if self._circuit_breaker_config is not None:
+            self._host_availabler.set_circuit_breaker_config(self._circuit_breaker_config)
+        if self._host_selector is not None:
+            self._host_availabler.set_host_selector(self._host_selector)
 
         # fill default caller config.
         if self._caller_config is None:
             self._caller_config = HTTPCallerConfig()
 
-    def _new_host_availabler(self) -> AbstractHostAvailabler:
-        if self._hosts is not None and len(self._hosts) > 0:
-            return self._host_availabler_factory.new_host_availabler(hosts=self._hosts,
-                                                                     project_id=self._project_id,
-                                                                     main_host=self._main_host)
-        return self._host_availabler_factory.new_host_availabler(hosts=self._region.get_hosts(),
+    def _new_host_availabler(self, with_snapshot: bool = True, blocking_init: bool = True) -> AbstractHostAvailabler:
+        kwargs = self._host_availabler_kwargs(with_snapshot)
+        if not blocking_init:
+            kwargs["blocking_init"] = False
+        return self._host_availabler_factory.new_host_availabler(hosts=self._get_hosts(),
                                                                  project_id=self._project_id,
-                                                                 main_host=self._main_host)
-
-    def _init_global_host_availabler(self):
+                                                                 main_host=self._main_host,
+                                                                 **kwargs)
+
+    def _new_async_host_availabler(self) -> AbstractHostAvailabler:
+        factory_class = type(self._host_availabler_factory)
+        if factory_class.new_async_host_availabler is HostAvailablerFactory.new_async_host_availabler \
+                and factory_class.new_host_availabler is not HostAvailablerFactory.new_host_availabler:
+            # the blocking availablers of the factory would ping on threads and block the build
+            raise Exception("host availabler factory must override new_async_host_availabler to build async client")
+        return self._host_availabler_factory.new_async_host_availabler(hosts=self._get_hosts(),
+                                                                       project_id=self._project_id,
+                                                                       main_host=self._main_host,
+                                                                       **self._host_availabler_kwargs(True))
+
+    def _get_hosts(self) -> List[str]:
+        hosts: List[str] = self._hosts
+        if hosts is None or len(hosts) == 0:
+            hosts = self._region.get_hosts()
+        return hosts
+
+    # only pass the optional arguments which are set, so that custom factories without them still work
+    def _host_availabler_kwargs(self, with_snapshot: bool) -> dict:
+        kwargs = {}
+        if self._non_blocking_build:
+            kwargs["blocking_init"] = False
+        if with_snapshot and self._host_snapshot_config is not None:
+            kwargs["snapshot_config"] = self._host_snapshot_config
+        return kwargs
+
+    # The availabler of the metrics reporter, it never blocks building an async client,
+    # which is usually done while the event loop is being set up.
+    def _init_global_host_availabler(self, async_mode: bool = False):
         global _global_host_availabler
         global _global_host_availabler_lock
 
@@ -178,19 +287,22 @@ class _HTTPClientBuilder(object):
         if _global_host_availabler is not None:
             _global_host_availabler_lock.release()
             return
-        _global_host_availabler = self._new_host_availabler()
+        # the snapshot file belongs to the client's own availabler
+        _global_host_availabler = self._new_host_availabler(with_snapshot=False, blocking_init=not async_mode)
         _global_host_availabler_lock.release()
 
-    def _new_http_caller(self) -> _HTTPCaller:
+    def _new_http_caller(self, caller_class=_HTTPCaller):
         if self._use_air_auth:
-            return _HTTPCaller(
+            return caller_class(
                 self._project_id,
                 self._tenant_id,
                 self._air_auth_token,
                 self._host_availabler,
                 self._caller_config,
                 self._schema,
-                self._keep_alive
+                self._keep_alive,
+                retry_policy=self._retry_policy,
+                rate_limiters=self._rate_limiters
             )
         credential: _Credential = _Credential(
             self._auth_ak,
@@ -198,7 +310,7 @@ class _HTTPClientBuilder(object):
             self._auth_service,
             self._region.get_auth_region(),
         )
-        _http_caller: _HTTPCaller = _HTTPCaller(
+        _http_caller = caller_class(
             self._project_id,
             self._tenant_id,
             self._air_auth_token,
@@ -206,7 +318,9 @@ class _HTTPClientBuilder(object):
             self._caller_config,
             self._schema,
             self._keep_alive,
-            credential
+            credential,
+            self._retry_policy,
+            self._rate_limiters
         )
         return _http_caller
 
@@ -17,10 +17,26 @@ METRICS_LOG_PATH: str = "/monitor/metrics/log"
 DEFAULT_REPORT_INTERVAL_SECONDS: float = 15
 DEFAULT_HTTP_TIMEOUT_SECONDS: float = 0.8
 MAX_TRY_TIMES: int = 3
-MAX_SPIN_TIMES: int = 5
+# a report, with all its chunks and retries, ends within the deadline
+DEFAULT_REPORT_DEADLINE_SECONDS: float = 3
+DEFAULT_REPORT_MAX_WORKERS: int = 4
+REPORT_CHUNK_BYTES: int = 512 * 1024
+REPORT_GZIP_LEVEL: int = 6
 SUCCESS_HTTP_CODE: int = 200
 MAX_METRICS_SIZE: int = 10000
 MAX_METRICS_LOG_SIZE: int = 5000
+# a flush starts before the interval ends when the buffered metrics or logs reach the watermarks
+DEFAULT_FLUSH_SERIES_WATERMARK: int = MAX_METRICS_SIZE // 2
+DEFAULT_FLUSH_LOG_WATERMARK: int = MAX_METRICS_LOG_SIZE // 2
+DEFAULT_FLUSH_LOG_BYTES_WATERMARK: int = 2 * 1024 * 1024
+FLUSH_TRIGGER_INTERVAL: str = "interval"
+FLUSH_TRIGGER_WATERMARK: str = "watermark"
+
+# metrics of the metrics collector itself
+METRICS_KEY_METRICS_DROPPED: str = "metrics.dropped"
+METRICS_KEY_METRICS_FLUSH_COST: str = "metrics.flush.cost"
+# the flush cost is only reported when a flush takes longer, so that an idle client has no metrics to upload
+SLOW_FLUSH_COST_MS: int = 1000
 
 # metrics log level
 LOG_LEVEL_TRACE: str = "trace"
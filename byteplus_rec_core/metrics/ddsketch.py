@@ -0,0 +1,86 @@
+import math
+from typing import Dict
+
+_DEFAULT_RELATIVE_ACCURACY: float = 0.01
+_DEFAULT_MAX_BINS: int = 2048
+
+
+# DDSketch is a quantile sketch with relative error guarantees, see https://arxiv.org/abs/1908.10693.
+# A value v is counted in the bin ceil(log(v) / log(gamma)), gamma = (1 + accuracy) / (1 - accuracy),
+# so any quantile is estimated within relative_accuracy of the true value, whatever the number of values.
+# The memory is bounded by max_bins: when it is exceeded, the lowest bins are collapsed into one, which
+# only loses accuracy of the lowest quantiles. Two sketches with the same accuracy can be merged.
+# Values <= 0 are counted as 0. The sketch is not thread safe.
+class DDSketch(object):
+    def __init__(self, relative_accuracy: float = _DEFAULT_RELATIVE_ACCURACY, max_bins: int = _DEFAULT_MAX_BINS):
+        self.relative_accuracy = relative_accuracy
+        self._gamma: float = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._multiplier: float = 1 / math.log(self._gamma)
+        self._max_bins = max(1, max_bins)
+        self._bins: Dict[int, int] = {}
+        self._zero_count: int = 0
+        self.count: int = 0
+        self.min: float = 0
+        self.max: float = 0
+        self.sum: float = 0
+
+    def add(self, value: float):
+        if self.count == 0 or value < self.min:
+            self.min = value
+        if self.count == 0 or value > self.max:
+            self.max = value
+        self.count += 1
+        self.sum += value
+        if value <= 0:
+            self._zero_count += 1
+            return
+        index = math.ceil(math.log(value) * self._multiplier)
+        bins = self._bins
+        bins[index] = bins.get(index, 0) + 1
+        if len(bins) > self._max_bins:
+            self._collapse()
+
+    # Returns the estimated value at the quantile (0 <= quantile <= 1), 0 if the sketch is empty.
+    def quantile(self, quantile: float) -> float:
+        if self.count == 0:
+            return 0
+        if quantile <= 0:
+            return self.min
+        if quantile >= 1:
+            return self.max
+        rank = quantile * (self.count - 1)
+        accumulated = self._zero_count
+        if accumulated > rank:
+            return max(self.min, 0)
+        for index in sorted(self._bins):
+            accumulated += self._bins[index]
+            if accumulated > rank:
+                # the middle of the bin, whose relative error to any value of the bin is at most accuracy
+                value = 2 * self._gamma ** index / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def merge(self, other: 'DDSketch'):
+        if other.count == 0:
+            return
+        if other._gamma != self._gamma:
+            raise ValueError("cannot merge sketches of different relative accuracy")
+        if self.count == 0 or other.min < self.min:
+            self.min = other.min
+        if self.count == 0 or other.max > self.max:
+            self.max = other.max
+        self.count += other.count
+        self.sum += other.sum
+        self._zero_count += other._zero_count
+        for index, bin_count in other._bins.items():
+            self._bins[index] = self._bins.get(index, 0) + bin_count
+        if len(self._bins) > self._max_bins:
+            self._collapse()
+
+    # merges the lowest bins into one so that at most max_bins are kept
+    def _collapse(self):
+        indexes = sorted(self._bins)
+        collapse_count = len(indexes) - self._max_bins + 1
+        target = indexes[collapse_count - 1]
+        for index in indexes[:collapse_count - 1]:
+            self._bins[target] += self._bins.pop(index)
@@ -2,9 +2,16 @@ from byteplus_rec_core import utils
 
 from byteplus_rec_core.metrics import constant
 from byteplus_rec_core.metrics.metrics_collector import MetricsCollector
+from byteplus_rec_core.metrics.metrics_handle import CounterHandle, TimerHandle, StoreHandle
 
 
 class Metrics(object):
+    # description: whether the metrics are collected, callers may skip building the tags when it is False
+    # example: if Metrics.is_enabled(): Metrics.counter("request.count", 1, "url:" + escape(url))
+    @staticmethod
+    def is_enabled() -> bool:
+        return MetricsCollector.is_enable_metrics()
+
     # description: Store tagKvs should be formatted as "key:value"
     # example: store("goroutine.count", 400, "ip:127.0.0.1")
     @staticmethod
@@ -29,6 +36,8 @@ class Metrics(object):
     # description: Store tagKvs should be formatted as "key:value"
     @staticmethod
     def latency(key: str, begin: int, *tag_kvs: str):
+        if not MetricsCollector.is_enable_metrics():
+            return
         MetricsCollector.emit_metrics(constant.METRICS_TYPE_TIMER, key,
                                       utils.current_time_millis() - begin, *tag_kvs)
 
@@ -45,3 +54,22 @@ class Metrics(object):
     @staticmethod
     def meter(key: str, value: int, *tag_kvs: str):
         MetricsCollector.emit_metrics(constant.METRICS_TYPE_METER, key, value, *tag_kvs)
+
+    # description: returns a handle bound to the series, the name and tags are resolved once.
+    #   Keep the handle and call inc on it instead of counter() on the hot path.
+    # example: handle = counter_handle("request.count", method="user"); handle.inc(1)
+    @staticmethod
+    def counter_handle(key: str, **tags) -> CounterHandle:
+        return CounterHandle(key, tags)
+
+    # description: returns a handle bound to the series, see counter_handle
+    # example: handle = timer_handle("request.cost", method="user"); handle.record(100)
+    @staticmethod
+    def timer_handle(key: str, **tags) -> TimerHandle:
+        return TimerHandle(key, tags)
+
+    # description: returns a handle bound to the series, see counter_handle
+    # example: handle = store_handle("goroutine.count", ip="127.0.0.1"); handle.set(400)
+    @staticmethod
+    def store_handle(key: str, **tags) -> StoreHandle:
+        return StoreHandle(key, tags)
@@ -0,0 +1,170 @@
+import itertools
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from byteplus_rec_core.metrics.constant import *
+from byteplus_rec_core.metrics.ddsketch import DDSketch
+
+log = logging.getLogger(__name__)
+
+# timer percentiles are within 1% of the true values
+_TIMER_RELATIVE_ACCURACY: float = 0.01
+_TIMER_PERCENTILES: List[Tuple[str, float]] = [("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("p999", 0.999)]
+
+# (metrics type, name, tag kvs), the tags are parsed only when the series is reported
+_SeriesKey = Tuple[str, str, Tuple[str, ...]]
+
+
+# One value of an aggregated series, as drained for reporting.
+class MetricPoint(object):
+    __slots__ = ("name", "type", "value", "timestamp", "tags")
+
+    def __init__(self, name: str, metrics_type: str, value: float, timestamp: int, tags: Dict[str, str]):
+        self.name = name
+        self.type = metrics_type
+        self.value = float(value)
+        self.timestamp = timestamp
+        self.tags = tags
+
+
+# The series emitted by one thread. The lock is only contended by the reporter swapping the series out,
+# which takes O(1), so emitting threads never wait for each other or for a report.
+class _SeriesBuffer(object):
+    def __init__(self):
+        self.series: Dict[_SeriesKey, object] = {}
+        # the series rejected by max_series since the last drain
+        self.dropped: int = 0
+        self.lock = threading.Lock()
+        self.thread = threading.current_thread()
+
+
+# MetricsAggregator aggregates the emitted metrics in memory by (type, name, tags) between two reports:
+# - counter, rate_counter and meter: the values are summed.
+# - store: the last value is kept.
+# - timer: the values are put into a DDSketch, reported as {name}.p50/.p90/.p99/.p999/.max stores
+#   and a {name}.count counter.
+# So the memory is bounded by the number of series instead of the number of requests, and no metric
+# is dropped at high QPS. Series beyond max_series in a report interval are dropped.
+# Each thread aggregates into its own buffer, the buffers are swapped out and merged when draining.
+# on_watermark is called (without blocking) when the series of a buffer reach series_watermark,
+# so that the series are drained before max_series is reached.
+class MetricsAggregator(object):
+    def __init__(self, max_series: int = MAX_METRICS_SIZE, series_watermark: Optional[int] = None,
+                 on_watermark: Optional[Callable[[], None]] = None):
+        self._max_series = max_series
+        self._series_watermark = series_watermark if series_watermark is not None else max_series
+        self._on_watermark = on_watermark
+        # the series rejected by max_series in the interval taken by the last drain
+        self.dropped: int = 0
+        self._local = threading.local()
+        self._buffers: List[_SeriesBuffer] = []
+        self._buffers_lock = threading.Lock()
+        # orders the stores of different threads, the latest one wins when merging
+        self._store_seq = itertools.count()
+
+    def put(self, metrics_type: str, name: str, value: float, tag_kvs: Tuple[str, ...]):
+        self.put_series((metrics_type, name, tag_kvs), value)
+
+    # key is (metrics type, name, tag kvs), pre-built by the metric handles
+    def put_series(self, key: _SeriesKey, value: float):
+        metrics_type = key[0]
+        buffer: _SeriesBuffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            buffer = self._new_buffer()
+        with buffer.lock:
+            series = buffer.series
+            if key not in series:
+                if len(series) >= self._max_series:
+                    buffer.dropped += 1
+                    self._reject(key[1])
+                    return
+                if len(series) + 1 == self._series_watermark and self._on_watermark is not None:
+                    self._on_watermark()
+            if metrics_type == METRICS_TYPE_TIMER:
+                sketch = series.get(key)
+                if sketch is None:
+                    sketch = series[key] = DDSketch(_TIMER_RELATIVE_ACCURACY)
+                sketch.add(value)
+                return
+            if metrics_type == METRICS_TYPE_STORE:
+                series[key] = (next(self._store_seq), value)
+                return
+            series[key] = series.get(key, 0) + value
+
+    def _new_buffer(self) -> _SeriesBuffer:
+        buffer = _SeriesBuffer()
+        with self._buffers_lock:
+            self._buffers.append(buffer)
+        self._local.buffer = buffer
+        return buffer
+
+    def empty(self) -> bool:
+        return all(len(buffer.series) == 0 for buffer in self._buffers)
+
+    # Takes the aggregated series and starts a new report interval.
+    def drain(self, prefix: str, timestamp: int) -> List[MetricPoint]:
+        with self._buffers_lock:
+            buffers = self._buffers
+            # the buffers of the exited threads are drained for the last time
+            self._buffers = [buffer for buffer in buffers if buffer.thread.is_alive()]
+        merged: Dict[_SeriesKey, object] = {}
+        dropped = 0
+        for buffer in buffers:
+            with buffer.lock:
+                series, buffer.series = buffer.series, {}
+                dropped += buffer.dropped
+                buffer.dropped = 0
+            dropped += self._merge(merged, series)
+        self.dropped = dropped
+        metrics: List[MetricPoint] = []
+        for (metrics_type, name, tag_kvs), value in merged.items():
+            if prefix:
+                name = "{}.{}".format(prefix, name)
+            tags = self._recover_tags(tag_kvs)
+            if metrics_type == METRICS_TYPE_STORE:
+                metrics.append(MetricPoint(name, metrics_type, value[1], timestamp, tags))
+                continue
+            if metrics_type != METRICS_TYPE_TIMER:
+                metrics.append(MetricPoint(name, metrics_type, value, timestamp, tags))
+                continue
+            for suffix, ratio in _TIMER_PERCENTILES:
+                metrics.append(MetricPoint(name + "." + suffix, METRICS_TYPE_STORE, value.quantile(ratio),
+                                           timestamp, tags))
+            metrics.append(MetricPoint(name + ".max", METRICS_TYPE_STORE, value.max, timestamp, tags))
+            metrics.append(MetricPoint(name + ".count", METRICS_TYPE_COUNTER, value.count, timestamp, tags))
+        return metrics
+
+    # returns the number of the series rejected by max_series
+    def _merge(self, merged: Dict[_SeriesKey, object], series: Dict[_SeriesKey, object]) -> int:
+        dropped = 0
+        for key, value in series.items():
+            old_value = merged.get(key)
+            if old_value is None:
+                if len(merged) >= self._max_series:
+                    dropped += 1
+                    self._reject(key[1])
+                    continue
+                merged[key] = value
+            elif key[0] == METRICS_TYPE_TIMER:
+                old_value.merge(value)
+            elif key[0] == METRICS_TYPE_STORE:
+                merged[key] = max(old_value, value, key=lambda seq_value: seq_value[0])
+            else:
+                merged[key] = old_value + value
+        return dropped
+
+    @staticmethod
+    def _recover_tags(tag_kvs: Tuple[str, ...]) -> dict:
+        tags = {}
+        for tag in tag_kvs:
+            kv = tag.split(':', 1)  # only split once, the first part is key, the rest is value
+            if len(kv) < 2:
+                continue
+            tags[kv[0]] = kv[1]
+        return tags
+
+    @staticmethod
+    def _reject(name: str):
+        log.debug("[BytePlusSDK][Metrics]: The number of metrics series exceeds the limit, "
+                  "the metrics write is rejected, name:%s", name)
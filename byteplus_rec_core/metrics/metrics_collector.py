@@ -1,14 +1,15 @@
 import logging
 import threading
 import time
+from collections import deque
 from threading import Lock
-from queue import Queue
-from typing import Optional, List
+from typing import Deque, List, Optional
 
 from byteplus_rec_core.metrics.metrics_option import *
 from byteplus_rec_core.metrics.constant import *
+from byteplus_rec_core.metrics import wire_encoder
+from byteplus_rec_core.metrics.metrics_aggregator import MetricsAggregator, MetricPoint
 from byteplus_rec_core.metrics.metrics_reporter import MetricsReporter
-from byteplus_rec_core.metrics.protocol import Metric, MetricMessage, MetricLog, MetricLogMessage
 
 log = logging.getLogger(__name__)
 
@@ -17,13 +18,20 @@ class MetricsCollector(object):
     metrics_cfg: MetricsCfg = None
     host_availabler = None
     metrics_reporter: MetricsReporter
-    metrics_collector: Queue = None
-    metrics_log_collector: Queue = None
-    cleaning_metrics_collector: bool = False
-    cleaning_metrics_log_collector: bool = False
+    metrics_aggregator: MetricsAggregator = None
+    # the logs encoded as MetricLogMessage.metric_logs entries, see wire_encoder
+    metrics_log_collector: Deque[bytes] = None
     initialed: bool = False
     _cancel = None
     lock: Lock = Lock()
+    # set to wake the flush thread up when a watermark is reached
+    _flush_event: Optional[threading.Event] = None
+    # the interval report and the watermark flush do not run at the same time
+    _report_lock: Lock = Lock()
+    # approximate, updated without a lock
+    _log_bytes: int = 0
+    _dropped_logs: int = 0
+    _dropped_logs_lock: Lock = Lock()
 
     @classmethod
     def init(cls, cfg: MetricsCfg = None, host_availabler=None):
@@ -44,33 +52,65 @@ class MetricsCollector(object):
 
     @classmethod
     def _do_init(cls, cfg: MetricsCfg, host_availabler=None):
-        cls.lock.acquire()
-        if cls.initialed:
-            return
-        cls.metrics_cfg = cfg
-        cls.host_availabler = host_availabler
-        # initialize metrics reporter
-        cls.metrics_reporter = MetricsReporter(cls.metrics_cfg)
-        # initialize metrics collector
-        cls.metrics_collector = Queue(maxsize=MAX_METRICS_SIZE)
-        cls.metrics_log_collector = Queue(maxsize=MAX_METRICS_LOG_SIZE)
-
-        if not cls.is_enable_metrics() and not cls.is_enable_metrics_log():
+        with cls.lock:
+            if cls.initialed:
+                return
+            cls.metrics_cfg = cfg
+            cls.host_availabler = host_availabler
+            # initialize metrics reporter
+            cls.metrics_reporter = MetricsReporter(cls.metrics_cfg)
+            # initialize metrics collector
+            cls.metrics_aggregator = MetricsAggregator(MAX_METRICS_SIZE, cfg.flush_series_watermark,
+                                                       cls._trigger_flush)
+            # append and popleft of deque are thread safe, neither the emitting threads nor the reporter wait
+            cls.metrics_log_collector = deque()
+            cls._log_bytes = 0
+
+            if not cls.is_enable_metrics() and not cls.is_enable_metrics_log():
+                cls.initialed = True
+                return
+            cls._start_flush_thread()
+            cls._cancel = utils.time_schedule(cls._report, cls.metrics_cfg.report_interval_seconds,
+                                              "metrics_report")
             cls.initialed = True
-            return
-        cls.cancel = utils.time_schedule(cls._report, cls.metrics_cfg.report_interval_seconds)
-        cls.initialed = True
-        cls.lock.release()
+
+    @classmethod
+    def _start_flush_thread(cls):
+        flush_event = threading.Event()
+        cls._flush_event = flush_event
+        threading.Thread(target=cls._flush_loop, args=(flush_event,), name="byteplus-rec-metrics-flush",
+                         daemon=True).start()
+
+    @classmethod
+    def _flush_loop(cls, flush_event: threading.Event):
+        while True:
+            flush_event.wait()
+            # replaced or removed by shutdown
+            if cls._flush_event is not flush_event:
+                return
+            flush_event.clear()
+            try:
+                cls._do_report(FLUSH_TRIGGER_WATERMARK)
+            except BaseException as e:
+                log.error("[BytePlusSDK][Metrics] flush occur exception, msg:%s", e)
+
+    # called on the emitting threads, only wakes the flush thread up
+    @classmethod
+    def _trigger_flush(cls):
+        flush_event = cls._flush_event
+        if flush_event is not None and not flush_event.is_set():
+            flush_event.set()
 
     @classmethod
     def is_initialed(cls) -> bool:
         return cls.initialed
 
+    # whether the metrics are collected, for the byteplus server or the sinks
     @classmethod
     def is_enable_metrics(cls) -> bool:
         if cls.metrics_cfg is None:
             return False
-        return cls.metrics_cfg.enable_metrics
+        return cls.metrics_cfg.enable_metrics or len(cls.metrics_cfg.sinks) > 0
 
     @classmethod
     def is_enable_metrics_log(cls) -> bool:
@@ -82,111 +122,126 @@ class MetricsCollector(object):
     def emit_metrics(cls, metrics_type: str, name: str, value: int, *tag_kvs: str):
         if not cls.is_enable_metrics():
             return
-        # spin when cleaning collector
-        try_times = 0
-        while cls.cleaning_metrics_collector:
-            if try_times >= MAX_SPIN_TIMES:
-                return
-            # sleep 10ms.
-            time.sleep(1 / 1000 * 10)
-            try_times += 1
-        if cls.metrics_collector.full():
-            log.debug("[BytePlusSDK][Metrics]: The number of metrics exceeds the limit, the metrics write is rejected")
+        # aggregated in memory, the metrics are built when reporting
+        cls.metrics_aggregator.put(metrics_type, name, value, tag_kvs)
+
+    # key is (metrics type, name, tag kvs), see metrics_handle
+    @classmethod
+    def emit_series(cls, key: tuple, value: int):
+        if not cls.is_enable_metrics():
             return
-        metric_name: str = name
-        if not utils.is_empty_str(cls.metrics_cfg.prefix):
-            metric_name = "{}.{}".format(cls.metrics_cfg.prefix, metric_name)
-        metric: Metric = Metric()
-        metric.name = metric_name
-        metric.type = metrics_type
-        metric.value = float(value)
-        metric.timestamp = utils.current_time_millis()
-        metric.tags.update(cls._recover_tags(*tag_kvs))
-        cls.metrics_collector.put(metric)
-
-    @classmethod
-    def _recover_tags(cls, *tag_kvs: str) -> dict:
-        tags = {}
-        for tag in tag_kvs:
-            kv = tag.split(':', 1)  # only split once, the first part is key, the rest is value
-            if len(kv) < 2:
-                continue
-            tags[kv[0]] = kv[1]
-        return tags
+        cls.metrics_aggregator.put_series(key, value)
 
     @classmethod
     def emit_log(cls, log_id: str, message: str, log_level: str, timestamp: int):
         if not cls.is_enable_metrics_log():
             return
-        # spin when cleaning collector
-        try_times = 0
-        while cls.cleaning_metrics_log_collector:
-            if try_times >= MAX_SPIN_TIMES:
-                return
-            # sleep 10ms.
-            time.sleep(1 / 1000 * 10)
-            try_times += 1
-        if cls.metrics_log_collector.full():
+        if len(cls.metrics_log_collector) >= MAX_METRICS_LOG_SIZE:
             log.debug("[BytePlusSDK][Metrics]: The number of metrics logs exceeds the limit, the metrics write is "
                       "rejected")
+            with cls._dropped_logs_lock:
+                cls._dropped_logs += 1
+            cls._trigger_flush()
             return
-        metric_log: MetricLog = MetricLog()
-        metric_log.id = log_id
-        metric_log.message = message
-        metric_log.level = log_level
-        metric_log.timestamp = timestamp
-        cls.metrics_log_collector.put(metric_log)
+        metric_log = bytearray()
+        wire_encoder.append_metric_log(metric_log, log_id, log_level, timestamp, message)
+        cls.metrics_log_collector.append(bytes(metric_log))
+        cls._log_bytes += len(metric_log)
+        if len(cls.metrics_log_collector) >= cls.metrics_cfg.flush_log_watermark or \
+                cls._log_bytes >= cls.metrics_cfg.flush_log_bytes_watermark:
+            cls._trigger_flush()
 
     @classmethod
     def _report(cls):
-        if cls.is_enable_metrics():
-            cls._report_metrics()
-        if cls.is_enable_metrics_log():
-            cls._report_metrics_log()
+        cls._do_report(FLUSH_TRIGGER_INTERVAL)
+
+    @classmethod
+    def _do_report(cls, trigger: str):
+        with cls._report_lock:
+            start = time.time()
+            if cls.is_enable_metrics():
+                cls._report_metrics()
+            if cls.is_enable_metrics_log():
+                cls._report_metrics_log()
+            cost = int((time.time() - start) * 1000)
+            # reported by the next flush
+            if cost >= SLOW_FLUSH_COST_MS:
+                cls.emit_metrics(METRICS_TYPE_TIMER, METRICS_KEY_METRICS_FLUSH_COST, cost, "trigger:" + trigger)
+            if cls.metrics_aggregator.dropped > 0:
+                cls.emit_metrics(METRICS_TYPE_COUNTER, METRICS_KEY_METRICS_DROPPED, cls.metrics_aggregator.dropped,
+                                 "type:metrics")
+                cls.metrics_aggregator.dropped = 0
+            with cls._dropped_logs_lock:
+                dropped_logs, cls._dropped_logs = cls._dropped_logs, 0
+            if dropped_logs > 0:
+                cls.emit_metrics(METRICS_TYPE_COUNTER, METRICS_KEY_METRICS_DROPPED, dropped_logs, "type:log")
 
     @classmethod
     def _report_metrics(cls):
-        if cls.metrics_collector.empty():
+        if cls.metrics_aggregator.empty():
             return
-        metrics: List[Metric] = []
-        cls.cleaning_metrics_collector = True
-        while True:
-            if cls.metrics_collector.empty():
-                break
-            metrics.append(cls.metrics_collector.get())
-        cls.cleaning_metrics_collector = False
-        cls._do_report_metrics(metrics)
+        prefix: str = "" if utils.is_empty_str(cls.metrics_cfg.prefix) else cls.metrics_cfg.prefix
+        metrics: List[MetricPoint] = cls.metrics_aggregator.drain(prefix, utils.current_time_millis())
+        # the sinks are local and fast, they do not wait for the upload, which may take report_deadline_seconds
+        cls._write_sinks(metrics)
+        if cls.metrics_cfg.enable_metrics:
+            cls._do_report_metrics(metrics)
 
     @classmethod
-    def _do_report_metrics(cls, metrics: List[Metric]):
+    def _write_sinks(cls, metrics: List[MetricPoint]):
+        for sink in cls.metrics_cfg.sinks:
+            try:
+                sink.write_metrics(metrics)
+            except BaseException as e:
+                log.error("[BytePlusSDK][Metrics] write metrics sink exception, sink:%s, msg:%s",
+                          type(sink).__name__, e)
+
+    @classmethod
+    def _do_report_metrics(cls, metrics: List[MetricPoint]):
         url: str = METRICS_URL_FORMAT.format(cls.metrics_cfg.http_schema, cls._get_domain(METRICS_PATH))
-        metric_message: MetricMessage = MetricMessage()
-        metric_message.metrics.extend(metrics)
+        # encoded straight into serialized MetricMessage chunks
+        chunks: List[bytes] = []
+        buf = bytearray()
+        for metric in metrics:
+            wire_encoder.append_metric(buf, metric.name, metric.type, metric.value, metric.timestamp, metric.tags)
+            if len(buf) >= REPORT_CHUNK_BYTES:
+                chunks.append(bytes(buf))
+                buf = bytearray()
+        if len(buf) > 0:
+            chunks.append(bytes(buf))
         try:
-            cls.metrics_reporter.report_metrics(metric_message, url)
+            cls.metrics_reporter.report_metrics(chunks, url)
         except BaseException as e:
             log.error("[BytePlusSDK][Metrics] report metrics exception, msg:{}, url:{}".format(str(e), url))
 
     @classmethod
     def _report_metrics_log(cls):
-        if cls.metrics_log_collector.empty():
+        if len(cls.metrics_log_collector) == 0:
             return
-        metric_logs: List[MetricLog] = []
-        cls.cleaning_metrics_log_collector = True
-        while True:
-            if cls.metrics_log_collector.empty():
-                break
-            metric_logs.append(cls.metrics_log_collector.get())
-        cls.cleaning_metrics_log_collector = False
+        # the logs emitted while draining are left to the next report
+        metric_logs: List[bytes] = [cls.metrics_log_collector.popleft()
+                                    for _ in range(len(cls.metrics_log_collector))]
+        cls._log_bytes = 0
         cls.do_report_metrics_log(metric_logs)
 
+    # metric_logs are encoded MetricLogMessage.metric_logs entries, any concatenation of them
+    # is a serialized MetricLogMessage
     @classmethod
-    def do_report_metrics_log(cls, metric_logs: List[MetricLog]):
+    def do_report_metrics_log(cls, metric_logs: List[bytes]):
         url: str = METRICS_LOG_URL_FORMAT.format(cls.metrics_cfg.http_schema, cls._get_domain(METRICS_LOG_PATH))
-        metric_log_message: MetricLogMessage = MetricLogMessage()
-        metric_log_message.metric_logs.extend(metric_logs)
+        chunks: List[bytes] = []
+        start = 0
+        chunk_bytes = 0
+        for i, metric_log in enumerate(metric_logs):
+            chunk_bytes += len(metric_log)
+            if chunk_bytes >= REPORT_CHUNK_BYTES:
+                chunks.append(b"".join(metric_logs[start:i + 1]))
+                start = i + 1
+                chunk_bytes = 0
+        if start < len(metric_logs):
+            chunks.append(b"".join(metric_logs[start:]))
         try:
-            cls.metrics_reporter.report_metrics_log(metric_log_message, url)
+            cls.metrics_reporter.report_metrics_log(chunks, url)
         except BaseException as e:
             log.error("[BytePlusSDK][Metrics] report metrics log exception, msg:{}, url:{}".format(str(e), url))
 
@@ -201,3 +256,10 @@ class MetricsCollector(object):
         cls.initialed = False
         if cls._cancel is not None:
             cls._cancel()
+        flush_event, cls._flush_event = cls._flush_event, None
+        if flush_event is not None:
+            flush_event.set()
+        if cls.metrics_cfg is not None:
+            cls.metrics_reporter.close()
+            for sink in cls.metrics_cfg.sinks:
+                sink.close()
@@ -0,0 +1,46 @@
+import sys
+from typing import Tuple
+
+from byteplus_rec_core import utils
+from byteplus_rec_core.metrics.constant import *
+from byteplus_rec_core.metrics.metrics_collector import MetricsCollector
+
+
+def _series_key(metrics_type: str, name: str, tags: dict) -> Tuple[str, str, Tuple[str, ...]]:
+    # same series as the "key:value" tags of Metrics.counter etc., the values are escaped once here
+    tag_kvs = tuple(sys.intern("{}:{}".format(key, utils.escape_metrics_tag_value(str(value))))
+                    for key, value in tags.items())
+    return metrics_type, sys.intern(name), tag_kvs
+
+
+# A handle is bound to one series, the name and the tags are resolved when it is created,
+# so recording a value costs a dict update. Create the handles once and keep them, see Metrics.counter_handle.
+class CounterHandle(object):
+    def __init__(self, name: str, tags: dict):
+        self._key = _series_key(METRICS_TYPE_COUNTER, name, tags)
+
+    def inc(self, value: int = 1):
+        MetricsCollector.emit_series(self._key, value)
+
+
+class TimerHandle(object):
+    def __init__(self, name: str, tags: dict):
+        self._key = _series_key(METRICS_TYPE_TIMER, name, tags)
+
+    # The unit of `value` is milliseconds
+    def record(self, value: int):
+        MetricsCollector.emit_series(self._key, value)
+
+    # The unit of `begin` is milliseconds
+    def latency(self, begin: int):
+        if not MetricsCollector.is_enable_metrics():
+            return
+        MetricsCollector.emit_series(self._key, utils.current_time_millis() - begin)
+
+
+class StoreHandle(object):
+    def __init__(self, name: str, tags: dict):
+        self._key = _series_key(METRICS_TYPE_STORE, name, tags)
+
+    def set(self, value: int):
+        MetricsCollector.emit_series(self._key, value)
@@ -4,38 +4,44 @@ from byteplus_rec_core.metrics import constant
 from byteplus_rec_core.metrics.metrics_collector import MetricsCollector
 
 
+# The message is formatted only when metrics log is enabled, so pass the arguments
+# as they are (e.g. headers instead of str(headers)) and let `log_format` stringify them.
 class MetricsLog(object):
+    @staticmethod
+    def is_enabled() -> bool:
+        return MetricsCollector.is_enable_metrics_log()
+
     @staticmethod
     def trace(log_id: str, log_format: str, *args):
-        message: str = log_format.format(*args)
-        MetricsCollector.emit_log(log_id, message, constant.LOG_LEVEL_TRACE, utils.current_time_millis())
+        MetricsLog._emit(log_id, constant.LOG_LEVEL_TRACE, log_format, args)
 
     @staticmethod
     def debug(log_id: str, log_format: str, *args):
-        message: str = log_format.format(*args)
-        MetricsCollector.emit_log(log_id, message, constant.LOG_LEVEL_DEBUG, utils.current_time_millis())
+        MetricsLog._emit(log_id, constant.LOG_LEVEL_DEBUG, log_format, args)
 
     @staticmethod
     def info(log_id: str, log_format: str, *args):
-        message: str = log_format.format(*args)
-        MetricsCollector.emit_log(log_id, message, constant.LOG_LEVEL_INFO, utils.current_time_millis())
+        MetricsLog._emit(log_id, constant.LOG_LEVEL_INFO, log_format, args)
 
     @staticmethod
     def notice(log_id: str, log_format: str, *args):
-        message: str = log_format.format(*args)
-        MetricsCollector.emit_log(log_id, message, constant.LOG_LEVEL_NOTICE, utils.current_time_millis())
+        MetricsLog._emit(log_id, constant.LOG_LEVEL_NOTICE, log_format, args)
 
     @staticmethod
     def warn(log_id: str, log_format: str, *args):
-        message: str = log_format.format(*args)
-        MetricsCollector.emit_log(log_id, message, constant.LOG_LEVEL_WARN, utils.current_time_millis())
+        MetricsLog._emit(log_id, constant.LOG_LEVEL_WARN, log_format, args)
 
     @staticmethod
     def error(log_id: str, log_format: str, *args):
-        message: str = log_format.format(*args)
-        MetricsCollector.emit_log(log_id, message, constant.LOG_LEVEL_ERROR, utils.current_time_millis())
+        MetricsLog._emit(log_id, constant.LOG_LEVEL_ERROR, log_format, args)
 
     @staticmethod
     def fatal(log_id: str, log_format: str, *args):
+        MetricsLog._emit(log_id, constant.LOG_LEVEL_FATAL, log_format, args)
+
+    @staticmethod
+    def _emit(log_id: str, log_level: str, log_format: str, args: tuple):
+        if not MetricsCollector.is_enable_metrics_log():
+            return
         message: str = log_format.format(*args)
-        MetricsCollector.emit_log(log_id, message, constant.LOG_LEVEL_FATAL, utils.current_time_millis())
+        MetricsCollector.emit_log(log_id, message, log_level, utils.current_time_millis())
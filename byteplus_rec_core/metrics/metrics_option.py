@@ -1,7 +1,9 @@
 from abc import abstractmethod
+from typing import List, Optional
 
 from byteplus_rec_core import utils
 from byteplus_rec_core.metrics.constant import *
+from byteplus_rec_core.metrics.metrics_sink import MetricsSink
 
 
 class MetricsCfg(object):
@@ -9,7 +11,13 @@ class MetricsCfg(object):
                  domain: str = DEFAULT_METRICS_DOMAIN, prefix: str = DEFAULT_METRICS_PREFIX,
                  http_schema: str = DEFAULT_HTTP_SCHEMA,
                  report_interval_seconds: float = DEFAULT_REPORT_INTERVAL_SECONDS,
-                 http_timeout_seconds: float = DEFAULT_HTTP_TIMEOUT_SECONDS):
+                 http_timeout_seconds: float = DEFAULT_HTTP_TIMEOUT_SECONDS,
+                 flush_series_watermark: int = DEFAULT_FLUSH_SERIES_WATERMARK,
+                 flush_log_watermark: int = DEFAULT_FLUSH_LOG_WATERMARK,
+                 flush_log_bytes_watermark: int = DEFAULT_FLUSH_LOG_BYTES_WATERMARK,
+                 report_deadline_seconds: float = DEFAULT_REPORT_DEADLINE_SECONDS,
+                 report_max_workers: int = DEFAULT_REPORT_MAX_WORKERS,
+                 sinks: Optional[List[MetricsSink]] = None):
         # When metrics are enabled, monitoring metrics will be reported to the byteplus server during use.
         self.enable_metrics: bool = enable_metrics
         # When metrics log is enabled, the log will be reported to the byteplus server during use.
@@ -20,11 +28,26 @@ class MetricsCfg(object):
         self.prefix: str = prefix
         # Use this httpSchema to report metrics to byteplus server, default is https.
         self.http_schema: str = http_schema
-        # The reporting interval, the default is 15s, if the QPS is high,
-        # the reporting interval can be reduced to prevent data loss.
+        # The reporting interval, the default is 15s.
+        # Metrics and logs are also flushed early when the buffers reach the watermarks below.
         self.report_interval_seconds: float = report_interval_seconds
         # Timeout for request reporting.
         self.http_timeout_seconds: float = http_timeout_seconds
+        # Flush when the metrics series buffered by a thread reach this number.
+        self.flush_series_watermark: int = flush_series_watermark
+        # Flush when the buffered logs reach this number.
+        self.flush_log_watermark: int = flush_log_watermark
+        # Flush when the messages of the buffered logs reach this size (approximately).
+        self.flush_log_bytes_watermark: int = flush_log_bytes_watermark
+        # A report, retries included, is given up after this time, so that a slow metrics service
+        # does not delay the next report or shutdown.
+        self.report_deadline_seconds: float = report_deadline_seconds
+        # The max number of chunks of a large report uploaded concurrently.
+        self.report_max_workers: int = report_max_workers
+        # The sinks receiving the metrics at every flush, such as PrometheusSink, StatsdSink and CallbackSink.
+        # They are written before the report to the byteplus server, and also when metrics are not enabled,
+        # in which case the metrics are only written to the sinks.
+        self.sinks: List[MetricsSink] = sinks or []
 
 
 class MetricsOption(object):
@@ -88,6 +111,49 @@ class MetricsOption(object):
 
         return OptionImpl()
 
+    # set the watermarks of flushing before the reporting interval ends, a value <= 0 keeps the default
+    @staticmethod
+    def with_flush_watermarks(series_count: int, log_count: int, log_bytes: int):
+        class OptionImpl(MetricsOption):
+            def fill(self, cfg: MetricsCfg) -> None:
+                if series_count > 0:
+                    cfg.flush_series_watermark = series_count
+                if log_count > 0:
+                    cfg.flush_log_watermark = log_count
+                if log_bytes > 0:
+                    cfg.flush_log_bytes_watermark = log_bytes
+
+        return OptionImpl()
+
+    # set the deadline of a report, including the retries
+    @staticmethod
+    def with_report_deadline_seconds(report_deadline_seconds: float):
+        class OptionImpl(MetricsOption):
+            def fill(self, cfg: MetricsCfg) -> None:
+                if report_deadline_seconds > 0:
+                    cfg.report_deadline_seconds = report_deadline_seconds
+
+        return OptionImpl()
+
+    # set the max number of chunks of a large report uploaded concurrently
+    @staticmethod
+    def with_report_max_workers(report_max_workers: int):
+        class OptionImpl(MetricsOption):
+            def fill(self, cfg: MetricsCfg) -> None:
+                if report_max_workers > 0:
+                    cfg.report_max_workers = report_max_workers
+
+        return OptionImpl()
+
+    # add the sinks receiving the metrics at every flush, see MetricsSink
+    @staticmethod
+    def with_sinks(*sinks: MetricsSink):
+        class OptionImpl(MetricsOption):
+            def fill(self, cfg: MetricsCfg) -> None:
+                cfg.sinks = cfg.sinks + list(sinks)
+
+        return OptionImpl()
+
     @staticmethod
     def with_metrics_timeout_seconds(metrics_timeout_seconds: int):
         class OptionImpl(MetricsOption):
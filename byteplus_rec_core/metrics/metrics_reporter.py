@@ -1,33 +1,84 @@
+import gzip
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Optional
+
 import requests
 from byteplus_rec_core import utils
 from requests import Response
+from requests.adapters import HTTPAdapter
 
 from byteplus_rec_core.exception import BizException
 from byteplus_rec_core.metrics import constant
-from byteplus_rec_core.metrics.metrics_collector import MetricsCfg
-from byteplus_rec_core.metrics.protocol import MetricLogMessage, MetricMessage
+from byteplus_rec_core.metrics.metrics_option import MetricsCfg
 
 
+# MetricsReporter uploads the metrics and logs of one report:
+# - the payloads are gzip compressed.
+# - a large report comes as chunks of about REPORT_CHUNK_BYTES, which are sent concurrently
+#   by up to report_max_workers threads, each with its own pooled connection.
+# - the whole report, retries included, ends within report_deadline_seconds. The chunks still running
+#   at the deadline are abandoned, so a slow metrics backend never stretches the report loop.
 class MetricsReporter(object):
     def __init__(self, metrics_cfg: MetricsCfg):
-        self._http_cli = requests.Session()
         self._metrics_cfg = metrics_cfg
+        self._max_workers = max(1, metrics_cfg.report_max_workers)
+        self._http_cli = requests.Session()
+        self._http_cli.mount("https://", HTTPAdapter(pool_maxsize=self._max_workers))
+        self._http_cli.mount("http://", HTTPAdapter(pool_maxsize=self._max_workers))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
 
-    def report_metrics(self, metric_message: MetricMessage, url: str):
-        req_bytes: bytes = metric_message.SerializeToString()
-        headers: dict = self._build_metrics_headers()
-        self._do_request(url, req_bytes, headers)
+    # each chunk is a serialized MetricMessage
+    def report_metrics(self, chunks: List[bytes], url: str):
+        self._report_chunks(url, chunks)
 
-    def report_metrics_log(self, metric_log_message: MetricLogMessage, url: str):
-        req_bytes: bytes = metric_log_message.SerializeToString()
-        headers: dict = self._build_metrics_headers()
-        self._do_request(url, req_bytes, headers)
+    # each chunk is a serialized MetricLogMessage
+    def report_metrics_log(self, chunks: List[bytes], url: str):
+        self._report_chunks(url, chunks)
 
-    def _do_request(self, url: str, req_bytes: bytes, headers: dict):
+    def _report_chunks(self, url: str, chunks: List[bytes]):
+        if len(chunks) == 0:
+            return
+        deadline = time.time() + self._metrics_cfg.report_deadline_seconds
+        if len(chunks) == 1:
+            self._do_request(url, gzip.compress(chunks[0], constant.REPORT_GZIP_LEVEL), deadline)
+            return
+        executor = self._get_executor()
+        futures = [executor.submit(self._do_compress_request, url, chunk, deadline) for chunk in chunks]
+        done, not_done = wait(futures, timeout=max(0.0, deadline - time.time()))
+        for future in not_done:
+            future.cancel()
+        errors = [future.exception() for future in done if future.exception() is not None]
+        if len(not_done) > 0:
+            raise BizException("report exceeds deadline, url:{}, unfinished chunks:{}/{}"
+                               .format(url, len(not_done), len(chunks)))
+        if len(errors) > 0:
+            raise BizException("report fail, url:{}, fail chunks:{}/{}, err:{}"
+                               .format(url, len(errors), len(chunks), errors[0]))
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self._max_workers,
+                                                        thread_name_prefix="byteplus-rec-metrics-report")
+        return self._executor
+
+    def _do_compress_request(self, url: str, req_bytes: bytes, deadline: float):
+        self._do_request(url, gzip.compress(req_bytes, constant.REPORT_GZIP_LEVEL), deadline)
+
+    def _do_request(self, url: str, req_bytes: bytes, deadline: float):
+        headers: dict = self._build_metrics_headers()
         for i in range(constant.MAX_TRY_TIMES):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise BizException("report exceeds deadline, url:{}".format(url))
             try:
                 response: Response = self._http_cli.post(url=url, headers=headers, data=req_bytes,
-                                                         timeout=self._metrics_cfg.http_timeout_seconds)
+                                                         timeout=min(self._metrics_cfg.http_timeout_seconds,
+                                                                     remaining))
                 if response.status_code == constant.SUCCESS_HTTP_CODE:
                     return
                 if response.content is None:
@@ -39,10 +90,16 @@ class MetricsReporter(object):
                     continue
                 raise BizException(str(e))
 
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._http_cli.close()
+
     @staticmethod
     def _build_metrics_headers() -> dict:
         headers = {
             "Content-Type": "application/x-protobuf",
+            "Content-Encoding": "gzip",
             "Accept": "application/json"
         }
         return headers
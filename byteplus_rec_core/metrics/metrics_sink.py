@@ -0,0 +1,177 @@
+import logging
+import re
+import socket
+import threading
+from abc import abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+from byteplus_rec_core.metrics.constant import *
+from byteplus_rec_core.metrics.metrics_aggregator import MetricPoint
+
+log = logging.getLogger(__name__)
+
+_DEFAULT_PROMETHEUS_HOST: str = "127.0.0.1"
+_DEFAULT_PROMETHEUS_PORT: int = 9464
+_DEFAULT_STATSD_HOST: str = "127.0.0.1"
+_DEFAULT_STATSD_PORT: int = 8125
+# fits the MTU of most networks, so a packet is never fragmented
+_DEFAULT_STATSD_MAX_PACKET_BYTES: int = 1432
+
+_COUNTER_TYPES = (METRICS_TYPE_COUNTER, METRICS_TYPE_RATE_COUNTER, METRICS_TYPE_METER)
+
+
+# MetricsSink receives the aggregated series at every flush of MetricsCollector, besides the report
+# to the byteplus server. The timers come as their {name}.p50/.p90/.p99/.p999/.max stores and
+# {name}.count counter, counters come as the sum since the last flush.
+# write_metrics runs on the flush thread, it should return quickly and must not emit metrics.
+class MetricsSink(object):
+    @abstractmethod
+    def write_metrics(self, metrics: List[MetricPoint]):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# Calls `callback` with the series of every flush.
+class CallbackSink(MetricsSink):
+    def __init__(self, callback: Callable[[List[MetricPoint]], None]):
+        self._callback = callback
+
+    def write_metrics(self, metrics: List[MetricPoint]):
+        self._callback(metrics)
+
+
+# Serves the series in the Prometheus text format at http://host:port/metrics.
+# Counters are accumulated since the sink starts, stores are exported as gauges of the last value.
+# The names are sanitized for Prometheus, e.g. byteplus.rec.sdk.request.count -> byteplus_rec_sdk_request_count.
+class PrometheusSink(MetricsSink):
+    def __init__(self, port: int = _DEFAULT_PROMETHEUS_PORT, host: str = _DEFAULT_PROMETHEUS_HOST):
+        # (name, sorted tags) -> value
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+        self._gauges: Dict[Tuple[str, tuple], float] = {}
+        self._lock = threading.Lock()
+        sink = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = sink.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="byteplus-rec-prometheus-sink",
+                         daemon=True).start()
+
+    # the bound port, useful when the sink is created with port 0
+    @property
+    def port(self) -> int:
+        return self._server.server_port
+
+    def write_metrics(self, metrics: List[MetricPoint]):
+        with self._lock:
+            for metric in metrics:
+                key = (self._sanitize_name(metric.name), tuple(sorted(metric.tags.items())))
+                if metric.type in _COUNTER_TYPES:
+                    self._counters[key] = self._counters.get(key, 0) + metric.value
+                else:
+                    self._gauges[key] = metric.value
+
+    def render(self) -> str:
+        with self._lock:
+            counters = list(self._counters.items())
+            gauges = list(self._gauges.items())
+        lines: List[str] = []
+        for metric_type, series in (("counter", counters), ("gauge", gauges)):
+            series.sort()
+            last_name: Optional[str] = None
+            for (name, tags), value in series:
+                if name != last_name:
+                    lines.append("# TYPE {} {}".format(name, metric_type))
+                    last_name = name
+                lines.append("{}{} {}".format(name, self._format_labels(tags), repr(float(value))))
+        lines.append("")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _sanitize_name(name: str) -> str:
+        name = re.sub(r"[^a-zA-Z0-9_:]", "_", name)
+        if name[:1].isdigit():
+            name = "_" + name
+        return name
+
+    @classmethod
+    def _format_labels(cls, tags: tuple) -> str:
+        if len(tags) == 0:
+            return ""
+        labels = ["{}=\"{}\"".format(cls._sanitize_name(key), cls._escape_label_value(value))
+                  for key, value in tags]
+        return "{" + ",".join(labels) + "}"
+
+    @staticmethod
+    def _escape_label_value(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# Sends the series to a StatsD agent over UDP, as many lines per packet as max_packet_bytes allows.
+# Counters are sent as StatsD counters (|c) and stores as gauges (|g), the tags use the DogStatsD
+# format (|#key:value), which is understood by most agents.
+class StatsdSink(MetricsSink):
+    def __init__(self, host: str = _DEFAULT_STATSD_HOST, port: int = _DEFAULT_STATSD_PORT,
+                 max_packet_bytes: int = _DEFAULT_STATSD_MAX_PACKET_BYTES):
+        self._address = (host, port)
+        self._max_packet_bytes = max_packet_bytes
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+
+    def write_metrics(self, metrics: List[MetricPoint]):
+        packet = bytearray()
+        for metric in metrics:
+            line = self._format_line(metric)
+            if len(packet) > 0 and len(packet) + 1 + len(line) > self._max_packet_bytes:
+                self._send(packet)
+                packet = bytearray()
+            if len(packet) > 0:
+                packet += b"\n"
+            packet += line
+        if len(packet) > 0:
+            self._send(packet)
+
+    @classmethod
+    def _format_line(cls, metric: MetricPoint) -> bytes:
+        statsd_type = "c" if metric.type in _COUNTER_TYPES else "g"
+        value = int(metric.value) if metric.value.is_integer() else metric.value
+        line = "{}:{}|{}".format(cls._sanitize(metric.name), value, statsd_type)
+        if len(metric.tags) > 0:
+            line += "|#" + ",".join("{}:{}".format(cls._sanitize(key), re.sub(r"[|#,\n]", "_", tag_value))
+                                    for key, tag_value in metric.tags.items())
+        return line.encode("utf-8")
+
+    @staticmethod
+    def _sanitize(name: str) -> str:
+        return re.sub(r"[:|@#,\n]", "_", name)
+
+    def _send(self, packet: bytearray):
+        try:
+            self._socket.sendto(packet, self._address)
+        except OSError as e:
+            # the agent is down or the socket buffer is full, the packet is dropped like any UDP packet
+            log.debug("[BytePlusSDK][Metrics] send statsd packet fail, address:%s, err:%s", self._address, e)
+
+    def close(self):
+        self._socket.close()
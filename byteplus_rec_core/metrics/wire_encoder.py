@@ -0,0 +1,79 @@
+import struct
+
+# Encodes the messages of protocol/byteplus_rec_sdk_metrics.proto straight into the protobuf wire format,
+# without building the python protobuf objects.
+# Each function appends one entry of the repeated field of MetricMessage / MetricLogMessage to `buf`,
+# so the concatenation of any entries is a serialized MetricMessage / MetricLogMessage.
+
+# (field number << 3) | wire type, wire type 0 is varint, 1 is 64-bit and 2 is length-delimited
+_TAG_MESSAGE_ENTRY: int = 0x0a  # MetricMessage.metrics = 1, MetricLogMessage.metric_logs = 1
+_TAG_METRIC_NAME: int = 0x0a
+_TAG_METRIC_TYPE: int = 0x12
+_TAG_METRIC_TIMESTAMP: int = 0x18
+_TAG_METRIC_VALUE: int = 0x21
+_TAG_METRIC_TAGS: int = 0x2a
+_TAG_MAP_KEY: int = 0x0a
+_TAG_MAP_VALUE: int = 0x12
+_TAG_LOG_ID: int = 0x0a
+_TAG_LOG_LEVEL: int = 0x12
+_TAG_LOG_TIMESTAMP: int = 0x18
+_TAG_LOG_MESSAGE: int = 0x22
+
+_pack_double = struct.Struct("<d").pack
+
+
+def _append_varint(buf: bytearray, value: int):
+    if value < 0:
+        # int64 is encoded as its 64-bit two's complement
+        value += 1 << 64
+    while value > 0x7f:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _append_string(buf: bytearray, tag: int, value: str):
+    # proto3 does not encode the default values
+    if not value:
+        return
+    data = value.encode("utf-8")
+    buf.append(tag)
+    _append_varint(buf, len(data))
+    buf += data
+
+
+def _append_entry(buf: bytearray, entry: bytearray):
+    buf.append(_TAG_MESSAGE_ENTRY)
+    _append_varint(buf, len(entry))
+    buf += entry
+
+
+def append_metric(buf: bytearray, name: str, metrics_type: str, value: float, timestamp: int, tags: dict):
+    metric = bytearray()
+    _append_string(metric, _TAG_METRIC_NAME, name)
+    _append_string(metric, _TAG_METRIC_TYPE, metrics_type)
+    if timestamp != 0:
+        metric.append(_TAG_METRIC_TIMESTAMP)
+        _append_varint(metric, timestamp)
+    if value != 0:
+        metric.append(_TAG_METRIC_VALUE)
+        metric += _pack_double(value)
+    for key, tag_value in tags.items():
+        tag = bytearray()
+        _append_string(tag, _TAG_MAP_KEY, key)
+        _append_string(tag, _TAG_MAP_VALUE, tag_value)
+        metric.append(_TAG_METRIC_TAGS)
+        _append_varint(metric, len(tag))
+        metric += tag
+    _append_entry(buf, metric)
+
+
+def append_metric_log(buf: bytearray, log_id: str, level: str, timestamp: int, message: str):
+    metric_log = bytearray()
+    _append_string(metric_log, _TAG_LOG_ID, log_id)
+    _append_string(metric_log, _TAG_LOG_LEVEL, level)
+    if timestamp != 0:
+        metric_log.append(_TAG_LOG_TIMESTAMP)
+        _append_varint(metric_log, timestamp)
+    _append_string(metric_log, _TAG_LOG_MESSAGE, message)
+    _append_entry(buf, metric_log)
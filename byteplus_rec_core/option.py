@@ -1,5 +1,7 @@
 import datetime
+import time
 from abc import abstractmethod
+from typing import Optional
 
 from byteplus_rec_core.options import Options
 
@@ -11,6 +13,9 @@ class Option(object):
 
     @staticmethod
     def conv_to_options(opts: tuple) -> Options:
+        # a request profile alone is used as it is, the options are already resolved
+        if len(opts) == 1 and type(opts[0]) is RequestProfile:
+            return opts[0].options
         options: Options = Options()
         for opt in opts:
             opt.fill(options)
@@ -68,3 +73,60 @@ class Option(object):
                 options.server_timeout = timeout
 
         return OptionImpl()
+
+    # Enables hedging for this request. If no response arrives within `delay`,
+    # the same request (with the same request_id) is also sent to the next ranked host,
+    # the first response is used. By default, the delay is the observed p95 latency of the path.
+    # The blocking HTTPClient can not interrupt the request, so it uses the hedge response when the request fails,
+    # combine it with Option.with_timeout or Option.with_deadline.
+    # Only use it for idempotent requests such as predict.
+    @staticmethod
+    def with_hedge(delay: Optional[datetime.timedelta] = None):
+        class OptionImpl(Option):
+            def fill(self, options: Options) -> None:
+                options.hedge = True
+                options.hedge_delay = delay
+
+        return OptionImpl()
+
+    # Specifies the total time budget of the request, counted from the creation of this option,
+    # so the same option can be passed to every retry of utils.do_with_retry.
+    # Each attempt only gets the remaining time, "Timeout-Millis" is filled with the remaining time
+    # minus the network round trip time, and no retry or hedge starts once the deadline is too close.
+    @staticmethod
+    def with_deadline(timeout: datetime.timedelta):
+        deadline = time.monotonic() + timeout.total_seconds()
+
+        class OptionImpl(Option):
+            def fill(self, options: Options) -> None:
+                options.deadline = deadline
+
+        return OptionImpl()
+
+
+# RequestProfile holds options resolved once, together with the headers and the query string they produce,
+# so that the requests sharing them only add the request id and the auth headers.
+# Build it once per path by HTTPClient.new_request_profile and pass it as the only option, such as
+# `client.do_pb_request(path, request, response, profile)`. The profile must not be modified.
+# Combined with other options, it works like the options it was built from (without the compiled parts).
+class RequestProfile(Option):
+    def __init__(self, options: Options):
+        self._options = options
+
+    @property
+    def options(self) -> Options:
+        return self._options
+
+    def fill(self, options: Options) -> None:
+        compiled: Options = self._options
+        if compiled.timeout is not None:
+            options.timeout = compiled.timeout
+        if compiled.headers is not None:
+            options.headers = {**(options.headers or {}), **compiled.headers}
+        if compiled.queries is not None:
+            options.queries = {**(options.queries or {}), **compiled.queries}
+        if compiled.server_timeout is not None:
+            options.server_timeout = compiled.server_timeout
+        if compiled.hedge:
+            options.hedge = True
+            options.hedge_delay = compiled.hedge_delay
@@ -1,5 +1,5 @@
 import datetime
-from typing import Optional
+from typing import Optional, Dict
 
 
 class Options(object):
@@ -9,3 +9,12 @@ class Options(object):
         self.headers: Optional[dict] = None
         self.queries: Optional[dict] = None
         self.server_timeout: Optional[datetime.timedelta] = None
+        self.hedge: bool = False
+        self.hedge_delay: Optional[datetime.timedelta] = None
+        # time.monotonic() based deadline of the whole call, including retries and hedges
+        self.deadline: Optional[float] = None
+        # compiled by HTTPClient.new_request_profile, not set by any option
+        # the query string appended to the url, "" if there is no query
+        self.query_string: Optional[str] = None
+        # content type -> headers without the request id and the auth headers
+        self.header_templates: Optional[Dict[str, dict]] = None
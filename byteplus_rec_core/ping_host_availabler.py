@@ -1,11 +1,17 @@
 import logging
+import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, Future
 from typing import List, Optional, Dict
 import requests
 from requests import Response, Session
 
 from byteplus_rec_core import constant, utils
 from byteplus_rec_core.abtract_host_availabler import AbstractHostAvailabler, HostAvailabilityScore
+from byteplus_rec_core.host_snapshot import HostSnapshotConfig, load_host_snapshot, save_host_snapshot
+from byteplus_rec_core.metrics.metrics import Metrics
+from byteplus_rec_core.metrics.metrics_log import MetricsLog
 
 log = logging.getLogger(__name__)
 
@@ -14,6 +20,10 @@ _DEFAULT_PING_SCHEMA = "http"
 _DEFAULT_PING_URL_FORMAT: str = "{}://{}/predict/api/ping"
 _DEFAULT_PING_TIMEOUT_SECONDS: float = 0.3
 _DEFAULT_PING_INTERVAL_SECONDS: float = 1
+# size of the ping pool shared by all the availablers of the process
+_SHARED_PING_WORKERS: int = 16
+# extra time given to a scoring round beyond the ping timeout before the unfinished pings are given up
+_PING_ROUND_SLACK_SECONDS: float = 0.05
 
 
 class Config(object):
@@ -34,7 +44,9 @@ class PingHostAvailabler(AbstractHostAvailabler):
     def __init__(self, default_hosts: Optional[List[str]] = None,
                  project_id: Optional[str] = None,
                  config: Optional[Config] = None,
-                 main_host: Optional[str] = None):
+                 main_host: Optional[str] = None,
+                 blocking_init: bool = True,
+                 snapshot_config: Optional[HostSnapshotConfig] = None):
         if config is None:
             config = Config()
         self._config: Config = config
@@ -42,30 +54,147 @@ class PingHostAvailabler(AbstractHostAvailabler):
         self._host_window_map: Dict[str, _Window] = {}
         for host in default_hosts:
             self._host_window_map[host] = _Window(self._config.window_size)
+        self._snapshot_config: Optional[HostSnapshotConfig] = snapshot_config
+        self._snapshot_loaded: bool = False
+        self._snapshot_cancel = None
+        if snapshot_config is not None:
+            self._load_snapshot(project_id)
         super().__init__(
             default_hosts,
             project_id,
             main_host,
-            self._config.ping_interval_seconds
+            self._config.ping_interval_seconds,
+            blocking_init
         )
+        if snapshot_config is not None:
+            self._snapshot_cancel = utils.time_schedule(self._save_snapshot, snapshot_config.interval_seconds,
+                                                        "host_snapshot")
         return
 
+    def _load_snapshot(self, project_id: str):
+        host_results: Dict[str, List[bool]] = load_host_snapshot(self._snapshot_config, project_id)
+        for host, window in self._host_window_map.items():
+            results = host_results.get(host)
+            if results is None:
+                continue
+            for success in results[-window.size:]:
+                window.put(success)
+            self._snapshot_loaded = True
+        if self._snapshot_loaded:
+            log.info("[ByteplusSDK] host scores are restored from snapshot, path:%s", self._snapshot_config.path)
+
+    def _save_snapshot(self):
+        host_results = {host: window.results() for host, window in list(self._host_window_map.items())}
+        try:
+            save_host_snapshot(self._snapshot_config, self.project_id, host_results)
+        except BaseException as e:
+            log.warning("[ByteplusSDK] save host snapshot fail, path:%s, err:%s", self._snapshot_config.path, e)
+
+    def _stop_snapshot(self):
+        if self._snapshot_cancel is None:
+            return
+        self._snapshot_cancel()
+        self._snapshot_cancel = None
+        self._save_snapshot()
+
+    def _initial_host_scores(self, hosts: List[str]) -> Optional[List[HostAvailabilityScore]]:
+        if not self._snapshot_loaded:
+            return None
+        return [HostAvailabilityScore(host, 1 - self._host_window_map[host].failure_rate())
+                for host in hosts if host in self._host_window_map]
+
     def do_score_hosts(self, hosts: List[str]) -> List[HostAvailabilityScore]:
         log.debug("[ByteplusSDK] do score hosts:'%s'", hosts)
         if len(hosts) == 1:
             return [HostAvailabilityScore(hosts[0], 0.0)]
+        start = time.time()
+        # ping all hosts concurrently, so a round costs at most one ping timeout whatever the host count
+        executor: ThreadPoolExecutor = _get_ping_executor()
+        # host -> start time of its ping, set when the shared pool runs it
+        ping_start_times: Dict[str, float] = {}
+        futures: List[Future] = [executor.submit(self._timed_ping, host, ping_start_times) for host in hosts]
+        _, not_done = wait(futures, timeout=self._config.ping_timeout_seconds + _PING_ROUND_SLACK_SECONDS)
+        for future in not_done:
+            future.cancel()
+        now = time.time()
         host_availability_scores = []
-        for host in hosts:
-            window = self._host_window_map.get(host, None)
-            if window is None:
-                window = _Window(self._config.window_size)
-                self._host_window_map[host] = window
-            success = utils.ping(self.project_id, self._ping_http_cli, self._config.ping_url_format,
-                                 _DEFAULT_PING_SCHEMA, host, self._config.ping_timeout_seconds)
-            window.put(success)
-            host_availability_scores.append(HostAvailabilityScore(host, 1 - window.failure_rate()))
+        for host, future in zip(hosts, futures):
+            if not future.done() and now - ping_start_times.get(host, now) >= self._config.ping_timeout_seconds:
+                # a ping running longer than the ping timeout is regarded as failed
+                host_availability_scores.append(self._put_ping_result(host, False))
+                continue
+            if not future.done() or future.cancelled():
+                # the ping started late or never as the shared pool is busy, it says nothing about the host
+                log.debug("[ByteplusSDK] no ping result in the scoring round, host:%s", host)
+                host_availability_scores.append(self._current_score(host))
+                continue
+            success = future.exception() is None and future.result()
+            host_availability_scores.append(self._put_ping_result(host, success))
+        self._check_score_round_overrun(int((time.time() - start) * 1000))
         return host_availability_scores
 
+    def _timed_ping(self, host: str, ping_start_times: Dict[str, float]) -> bool:
+        ping_start_times[host] = time.time()
+        return self._ping(host)
+
+    def _ping(self, host: str) -> bool:
+        start = time.time()
+        success = utils.ping(self.project_id, self._ping_http_cli, self._config.ping_url_format,
+                             _DEFAULT_PING_SCHEMA, host, self._config.ping_timeout_seconds)
+        if success:
+            self.report_ping_rtt(host, int((time.time() - start) * 1000))
+        return success
+
+    def _check_score_round_overrun(self, cost: int):
+        if cost <= self._config.ping_interval_seconds * 1000:
+            return
+        metrics_tags = [
+            "type:score_hosts_overrun",
+            "project_id:" + self.project_id,
+        ]
+        Metrics.counter(constant.METRICS_KEY_COMMON_WARN, 1, *metrics_tags)
+        MetricsLog.warn("score_" + str(uuid.uuid1()),
+                        "[ByteplusSDK][Score] scoring round overran the interval, project_id:{}, cost:{}ms, "
+                        "interval:{}s", self.project_id, cost, self._config.ping_interval_seconds)
+        log.warning("[ByteplusSDK] scoring round overran the interval, cost:%dms, interval:%ss",
+                    cost, self._config.ping_interval_seconds)
+
+    def _put_ping_result(self, host: str, success: bool) -> HostAvailabilityScore:
+        window = self._get_window(host)
+        window.put(success)
+        self.report_probe_result(host, success)
+        return HostAvailabilityScore(host, 1 - window.failure_rate())
+
+    def _current_score(self, host: str) -> HostAvailabilityScore:
+        return HostAvailabilityScore(host, 1 - self._get_window(host).failure_rate())
+
+    def _get_window(self, host: str) -> '_Window':
+        window = self._host_window_map.get(host, None)
+        if window is None:
+            window = _Window(self._config.window_size)
+            self._host_window_map[host] = window
+        return window
+
+    def shutdown(self):
+        super().shutdown()
+        self._stop_snapshot()
+
+
+_ping_executor: Optional[ThreadPoolExecutor] = None
+_ping_executor_lock = threading.Lock()
+
+
+# The ping pool shared by all the availablers, so that the ping threads are bounded
+# whatever the number of clients of the process. It lives as long as the process.
+def _get_ping_executor() -> ThreadPoolExecutor:
+    global _ping_executor
+    if _ping_executor is None:
+        with _ping_executor_lock:
+            if _ping_executor is None:
+                _ping_executor = ThreadPoolExecutor(max_workers=_SHARED_PING_WORKERS,
+                                                    thread_name_prefix="byteplus-rec-ping")
+    return _ping_executor
+
 
 class _Window(object):
     def __init__(self, size: int):
@@ -87,3 +216,7 @@ class _Window(object):
 
     def failure_rate(self) -> float:
         return self.failure_count / self.size
+
+    # results from the oldest to the newest
+    def results(self) -> List[bool]:
+        return [self.items[(self.head + 1 + i) % self.size] for i in range(self.size)]
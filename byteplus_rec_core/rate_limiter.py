@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+from typing import Optional
+
+# the rate is halved when the server answers 429, at most once per this interval
+_DEFAULT_THROTTLE_BACKOFF_RATIO: float = 0.5
+_THROTTLE_MIN_INTERVAL_SECONDS: float = 1
+# the throttled rate never goes below this ratio of the configured rate
+_DEFAULT_MIN_RATE_RATIO: float = 0.1
+# after throttled, the rate grows by this ratio of the configured rate every second of successful traffic
+_DEFAULT_RECOVER_RATIO: float = 0.05
+
+
+# RateLimiter paces requests to at most `rate` per second with bursts of up to `burst` requests,
+# using GCRA (the generic cell rate algorithm): it only keeps the theoretical arrival time (tat)
+# of the next request, a request at `now` conforms if now >= tat - (burst - 1) / rate.
+# The rate adapts to the server quota: it is cut by backoff_ratio when the server answers 429,
+# then ramps back to the configured rate while requests succeed.
+class RateLimiter(object):
+    def __init__(self, rate: float, burst: Optional[int] = None,
+                 max_wait_seconds: Optional[float] = None,
+                 min_rate_ratio: float = _DEFAULT_MIN_RATE_RATIO,
+                 backoff_ratio: float = _DEFAULT_THROTTLE_BACKOFF_RATIO,
+                 recover_ratio: float = _DEFAULT_RECOVER_RATIO):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self._max_rate: float = float(rate)
+        self._rate: float = float(rate)
+        self._burst: int = max(1, burst if burst is not None else int(rate))
+        # how long a request waits for its turn at most, None waits until the request deadline
+        self.max_wait_seconds: Optional[float] = max_wait_seconds
+        self._min_rate: float = self._max_rate * min_rate_ratio
+        self._backoff_ratio = backoff_ratio
+        self._recover_step: float = self._max_rate * recover_ratio
+        self._tat: float = 0
+        self._last_throttle_time: float = 0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    # Reserves the next slot if it is available within timeout_seconds,
+    # returns the seconds to wait for it, or None without reserving.
+    def _reserve(self, timeout_seconds: Optional[float]) -> Optional[float]:
+        with self._lock:
+            now = time.monotonic()
+            interval = 1 / self._rate
+            tat = max(self._tat, now)
+            wait = tat - (self._burst - 1) * interval - now
+            if wait > 0 and timeout_seconds is not None and wait > timeout_seconds:
+                return None
+            self._tat = tat + interval
+            return max(0.0, wait)
+
+    def try_acquire(self) -> bool:
+        return self._reserve(0) is not None
+
+    # Blocks until the request may be sent, returns False if it would wait longer than timeout_seconds.
+    def acquire(self, timeout_seconds: Optional[float] = None) -> bool:
+        wait = self._reserve(timeout_seconds)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    async def acquire_async(self, timeout_seconds: Optional[float] = None) -> bool:
+        wait = self._reserve(timeout_seconds)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+    # Called when the server rejects a request by quota (429).
+    # Requests are paused for retry_after_seconds if the server tells it.
+    # Returns True if the rate is lowered.
+    def on_throttled(self, retry_after_seconds: Optional[float] = None) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if retry_after_seconds is not None:
+                self._tat = max(self._tat, now + retry_after_seconds)
+            if now - self._last_throttle_time < _THROTTLE_MIN_INTERVAL_SECONDS:
+                return False
+            self._last_throttle_time = now
+            self._rate = max(self._min_rate, self._rate * self._backoff_ratio)
+            return True
+
+    def on_success(self):
+        if self._rate >= self._max_rate:
+            return
+        with self._lock:
+            # about `rate` successes arrive per second, so the rate grows by recover_step per second
+            self._rate = min(self._max_rate, self._rate + self._recover_step / self._rate)
@@ -0,0 +1,113 @@
+import logging
+import random
+import time
+from typing import Optional, Tuple
+
+from byteplus_rec_core import constant, status_helper
+from byteplus_rec_core.exception import NetException, StatusException, BizException
+from byteplus_rec_core.metrics.metrics import Metrics
+from byteplus_rec_core.utils import _RatioBudget
+
+log = logging.getLogger(__name__)
+
+_DEFAULT_MAX_RETRY_TIMES: int = 2
+_DEFAULT_BASE_BACKOFF_SECONDS: float = 0.05
+_DEFAULT_MAX_BACKOFF_SECONDS: float = 2
+_DEFAULT_BUDGET_RATIO: float = 0.1
+# the retry budget can hold at most this number of retries, which allows short bursts
+_DEFAULT_BUDGET_MAX_TOKENS: float = 10
+_DEFAULT_RETRY_STATUS_CODES: Tuple[int, ...] = (
+    constant.STATUS_CODE_TOO_MANY_REQUEST,
+    constant.HTTP_STATUS_BAD_GATEWAY,
+    constant.HTTP_STATUS_SERVICE_UNAVAILABLE,
+    constant.HTTP_STATUS_GATEWAY_TIMEOUT,
+)
+
+
+# RetryPolicy decides whether and when a failed request is retried.
+# - the backoff before the n-th retry is a random value in [0, min(max_backoff, base_backoff * 2^n)]
+#   (exponential backoff with full jitter), or the Retry-After of the server if it is longer.
+# - retries are bounded by a per-client budget, at most budget_ratio of the requests are retried
+#   over time, so that the whole fleet does not multiply the load during an incident.
+# - network errors (NetException) and http status in retry_status_codes (429 and 5xx by default)
+#   are retried, the retry is sent to the next best host.
+# Attach it to HTTPClient by _HTTPClientBuilder.retry_policy, or pass it to utils.do_with_retry.
+# Requests are retried with the same request id, so retrying is only safe for idempotent requests.
+class RetryPolicy(object):
+    def __init__(self,
+                 max_retry_times: int = _DEFAULT_MAX_RETRY_TIMES,
+                 base_backoff_seconds: float = _DEFAULT_BASE_BACKOFF_SECONDS,
+                 max_backoff_seconds: float = _DEFAULT_MAX_BACKOFF_SECONDS,
+                 budget_ratio: float = _DEFAULT_BUDGET_RATIO,
+                 retry_status_codes: Tuple[int, ...] = _DEFAULT_RETRY_STATUS_CODES):
+        self.max_retry_times = max(0, max_retry_times)
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.retry_status_codes = retry_status_codes
+        self._budget = _RatioBudget(budget_ratio, _DEFAULT_BUDGET_MAX_TOKENS)
+
+    # called once for every request, it refills the retry budget
+    def on_request(self):
+        self._budget.deposit()
+
+    def is_retryable(self, e: BaseException) -> bool:
+        if isinstance(e, NetException):
+            return True
+        if isinstance(e, StatusException):
+            return e.status_code in self.retry_status_codes
+        return False
+
+    # Returns the seconds to wait before the retry_times-th retry (starts from 0),
+    # or None if the request should not be retried any more.
+    def next_backoff_seconds(self, e: Optional[BaseException], retry_times: int, *metrics_tags: str) \
+            -> Optional[float]:
+        if retry_times >= self.max_retry_times:
+            self._report("giveup", *metrics_tags)
+            return None
+        if not self._budget.try_spend():
+            self._report("budget_exhausted", *metrics_tags)
+            return None
+        self._report("retry", *metrics_tags)
+        backoff = random.uniform(0, min(self.max_backoff_seconds, self.base_backoff_seconds * (2 ** retry_times)))
+        if isinstance(e, StatusException) and e.retry_after_seconds is not None:
+            backoff = max(backoff, e.retry_after_seconds)
+        return backoff
+
+    # Retries `call` which returns a response with a `status.code`, such as the responses of byteplus rec SDKs.
+    # Besides retryable exceptions, responses whose code means server overload (429)
+    # or operation loss (410) are retried too.
+    def execute(self, call, *metrics_tags: str):
+        self.on_request()
+        retry_times = 0
+        while True:
+            try:
+                rsp = call()
+            except BaseException as e:
+                if not self.is_retryable(e):
+                    raise
+                backoff = self.next_backoff_seconds(e, retry_times, *metrics_tags)
+                if backoff is None:
+                    log.error("[DoRetryRequest] fail finally after retried '%s' times", retry_times)
+                    if isinstance(e, NetException):
+                        raise BizException(str(e))
+                    raise
+            else:
+                if not self._is_retryable_rsp(rsp):
+                    return rsp
+                backoff = self.next_backoff_seconds(None, retry_times, *metrics_tags)
+                if backoff is None:
+                    return rsp
+            time.sleep(backoff)
+            retry_times += 1
+
+    @staticmethod
+    def _is_retryable_rsp(rsp) -> bool:
+        status = getattr(rsp, "status", None)
+        code = getattr(status, "code", None)
+        if code is None:
+            return False
+        return status_helper.is_server_overload(code) or status_helper.is_loss_operation(code)
+
+    @staticmethod
+    def _report(retry_type: str, *metrics_tags: str):
+        Metrics.counter(constant.METRICS_KEY_REQUEST_RETRY, 1, "type:" + retry_type, *metrics_tags)
@@ -0,0 +1,181 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional, Deque, Tuple
+
+from byteplus_rec_core import constant
+from byteplus_rec_core.metrics.metrics import Metrics
+
+log = logging.getLogger(__name__)
+
+_DEFAULT_CORE_WORKERS: int = 8
+# workers beyond the core ones exit after idling this long
+_WORKER_IDLE_SECONDS: float = 60
+# a run starting later than this is reported, the timer thread is expected to be on time
+_REPORT_DELAY_SECONDS: float = 0.1
+
+
+class _ScheduledTask(object):
+    def __init__(self, call: Callable, interval_seconds: float, name: str, next_run_time: float):
+        self.call = call
+        self.interval_seconds = interval_seconds
+        self.name = name
+        self.next_run_time = next_run_time
+        self.cancelled = False
+        self.running = False
+
+
+# Scheduler runs all the periodic tasks of the process on one timer thread and a pool of workers,
+# instead of one sleeping thread per task.
+# - the timer thread only dispatches the due runs. The pool grows so that every due run gets a worker at once,
+#   so a blocking task (pinging hosts, uploading metrics) never delays the others. As a task never runs
+#   twice at a time, the workers are bounded by the number of tasks, those beyond core_workers exit when idle.
+# - tasks run at a fixed rate: the n-th run is due at start + n * interval, whatever the run time is.
+# - a run which is still running when the next one is due is not run twice: the due runs are skipped
+#   (coalesced) and the task is re-scheduled to its next slot in the future.
+# - cancel takes effect at once, the running run (if any) finishes but the task never runs again.
+# Only the abnormal runs are reported through Metrics, so that an idle client has no metrics to upload:
+# the runs overrunning the interval (cost), starting over _REPORT_DELAY_SECONDS late (delay) and the skipped runs.
+class Scheduler(object):
+    def __init__(self, core_workers: int = _DEFAULT_CORE_WORKERS):
+        self._core_workers = max(1, core_workers)
+        self._cond = threading.Condition()
+        # (next_run_time, seq, task), cancelled tasks are dropped lazily when they are popped
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._ready: Deque[_ScheduledTask] = deque()
+        self._worker_count: int = 0
+        # a worker is counted as idle from its spawn until it takes a run
+        self._idle_workers: int = 0
+        self._worker_seq = itertools.count()
+        self._timer_thread: Optional[threading.Thread] = None
+
+    # Schedules `call` every interval_seconds, the first run is after initial_delay_seconds.
+    # Returns a function which cancels the task.
+    def schedule(self, call: Callable, interval_seconds: float, name: Optional[str] = None,
+                 initial_delay_seconds: float = 0) -> Callable:
+        if name is None:
+            name = getattr(call, "__qualname__", None) or getattr(call, "__name__", "task")
+        task = _ScheduledTask(call, interval_seconds, name, time.monotonic() + initial_delay_seconds)
+        with self._cond:
+            self._push(task)
+            if self._timer_thread is None:
+                self._timer_thread = threading.Thread(target=self._timer_loop, name="byteplus-rec-scheduler",
+                                                      daemon=True)
+                self._timer_thread.start()
+            self._cond.notify_all()
+
+        def cancel_func():
+            with self._cond:
+                task.cancelled = True
+                self._cond.notify_all()
+
+        return cancel_func
+
+    def _push(self, task: _ScheduledTask):
+        heapq.heappush(self._heap, (task.next_run_time, next(self._seq), task))
+
+    def _timer_loop(self):
+        while True:
+            with self._cond:
+                task, late_seconds, skipped = self._wait_and_dispatch()
+            # metrics may block for a while, they are emitted without holding the lock
+            if skipped > 0:
+                self._report_skip(task, skipped)
+            if late_seconds is not None and late_seconds >= _REPORT_DELAY_SECONDS:
+                Metrics.timer(constant.METRICS_KEY_SCHEDULER_TASK_DELAY, int(late_seconds * 1000),
+                              "task:" + task.name)
+
+    # called with self._cond held, waits for the earliest due task and hands it to a worker,
+    # returns the task, how late the run starts (None if it is skipped) and the number of skipped runs
+    def _wait_and_dispatch(self) -> Tuple[_ScheduledTask, Optional[float], int]:
+        while True:
+            while len(self._heap) > 0 and self._heap[0][2].cancelled:
+                heapq.heappop(self._heap)
+            if len(self._heap) == 0:
+                self._cond.wait()
+                continue
+            now = time.monotonic()
+            delay = self._heap[0][0] - now
+            if delay > 0:
+                self._cond.wait(delay)
+                continue
+            _, _, task = heapq.heappop(self._heap)
+            # fixed rate, next_run_time does not depend on when the run finishes
+            task.next_run_time += task.interval_seconds
+            skipped = 0
+            if task.next_run_time <= now:
+                skipped = int((now - task.next_run_time) / task.interval_seconds) + 1
+                task.next_run_time += skipped * task.interval_seconds
+            self._push(task)
+            if task.running:
+                return task, None, skipped + 1
+            task.running = True
+            self._ready.append(task)
+            self._ensure_workers()
+            self._cond.notify_all()
+            return task, -delay, skipped
+
+    # called with self._cond held, spawns a worker for each ready run which no idle worker can take
+    def _ensure_workers(self):
+        while len(self._ready) > self._idle_workers:
+            self._idle_workers += 1
+            self._worker_count += 1
+            worker = threading.Thread(target=self._worker_loop, daemon=True,
+                                      name="byteplus-rec-scheduler-worker-{}".format(next(self._worker_seq)))
+            worker.start()
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                idle_start = time.monotonic()
+                while len(self._ready) == 0:
+                    if self._worker_count <= self._core_workers:
+                        self._cond.wait()
+                        continue
+                    idle_seconds = time.monotonic() - idle_start
+                    if idle_seconds >= _WORKER_IDLE_SECONDS:
+                        self._idle_workers -= 1
+                        self._worker_count -= 1
+                        return
+                    self._cond.wait(_WORKER_IDLE_SECONDS - idle_seconds)
+                self._idle_workers -= 1
+                task = self._ready.popleft()
+            self._run(task)
+
+    def _run(self, task: _ScheduledTask):
+        start = time.time()
+        try:
+            if not task.cancelled:
+                task.call()
+        except BaseException as e:
+            log.error("[ByteplusSDK] scheduled task occur exception, task:%s, err:%r", task.name, e)
+        finally:
+            with self._cond:
+                task.running = False
+                self._idle_workers += 1
+            cost_seconds = time.time() - start
+            if cost_seconds > task.interval_seconds:
+                Metrics.timer(constant.METRICS_KEY_SCHEDULER_TASK_COST, int(cost_seconds * 1000), "task:" + task.name)
+
+    @staticmethod
+    def _report_skip(task: _ScheduledTask, skipped: int):
+        log.warning("[ByteplusSDK] scheduled task overruns its interval, skip %d runs, task:%s", skipped, task.name)
+        Metrics.counter(constant.METRICS_KEY_SCHEDULER_TASK_SKIP, skipped, "task:" + task.name)
+
+
+_default_scheduler: Optional[Scheduler] = None
+_default_scheduler_lock = threading.Lock()
+
+
+# The scheduler shared by all the clients of the process, used by utils.time_schedule.
+def default_scheduler() -> Scheduler:
+    global _default_scheduler
+    if _default_scheduler is None:
+        with _default_scheduler_lock:
+            if _default_scheduler is None:
+                _default_scheduler = Scheduler()
+    return _default_scheduler
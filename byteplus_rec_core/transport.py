@@ -0,0 +1,76 @@
+from abc import abstractmethod
+from typing import Optional, Dict
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+
+class TransportResponse(object):
+    # The subset of requests.Response used by the callers and utils.ping.
+    def __init__(self, status_code: int, reason: str, headers, content: bytes):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+
+
+# Transport sends the requests of the blocking HTTPClient.
+# Implementations must be thread safe, pool the connections per host,
+# and return decompressed response bodies (responses may be gzipped).
+# The responses must provide status_code, reason, headers and content like TransportResponse.
+class Transport(object):
+    @abstractmethod
+    def post(self, url: str, headers: Dict[str, str], body: bytes, timeout: Optional[float] = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, url: str, headers: Dict[str, str], timeout: Optional[float] = None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# The default transport based on requests.Session.
+class RequestsTransport(Transport):
+    def __init__(self, max_idle_connections: int):
+        # requests.post creates a new connection for each request, and cannot reuse the connection.
+        # Change it to session mode. By default, it maintains a connection pool of up to 10 different hosts.
+        self._session: requests.Session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(pool_maxsize=max_idle_connections))
+        self._session.mount("http://", HTTPAdapter(pool_maxsize=max_idle_connections))
+
+    def post(self, url: str, headers: Dict[str, str], body: bytes, timeout: Optional[float] = None):
+        return self._session.post(url=url, headers=headers, data=body, timeout=timeout)
+
+    def get(self, url: str, headers: Dict[str, str], timeout: Optional[float] = None):
+        return self._session.get(url, headers=headers, timeout=timeout)
+
+    def close(self):
+        self._session.close()
+
+
+# A lean transport on urllib3.PoolManager, which requests is built on.
+# It skips the per-request work of requests: hooks, cookies, environment proxy lookup
+# and request preparation. The pre-built headers and body are sent as they are.
+# Proxies configured by environment variables are not used.
+class Urllib3Transport(Transport):
+    def __init__(self, max_idle_connections: int):
+        self._pool_manager = urllib3.PoolManager(maxsize=max_idle_connections, retries=False)
+
+    def post(self, url: str, headers: Dict[str, str], body: bytes, timeout: Optional[float] = None):
+        return self._request("POST", url, headers, body, timeout)
+
+    def get(self, url: str, headers: Dict[str, str], timeout: Optional[float] = None):
+        return self._request("GET", url, headers, None, timeout)
+
+    def _request(self, method: str, url: str, headers: Dict[str, str], body: Optional[bytes],
+                 timeout: Optional[float]) -> TransportResponse:
+        rsp = self._pool_manager.urlopen(method, url, body=body, headers=headers,
+                                         timeout=timeout if timeout is not None else urllib3.Timeout.DEFAULT_TIMEOUT,
+                                         redirect=False, preload_content=True, decode_content=True)
+        return TransportResponse(rsp.status, rsp.reason, rsp.headers, rsp.data)
+
+    def close(self):
+        self._pool_manager.clear()
@@ -1,14 +1,17 @@
+import asyncio
+import email.utils
 import threading
 import time
 import uuid
 from datetime import timedelta
 import logging
-from typing import List, Optional
+from typing import List, Optional, Union
 
 from byteplus_rec_core import constant
 from requests import Session, Response
 
 from byteplus_rec_core.exception import NetException, BizException
+from byteplus_rec_core.transport import Transport
 from byteplus_rec_core.metrics.metrics_log import MetricsLog
 
 log = logging.getLogger(__name__)
@@ -22,13 +25,17 @@ def _milliseconds(delta: timedelta) -> int:
     return int(delta.total_seconds() * 1000.0)
 
 
-def do_with_retry(call, request, opts: tuple, retry_times: int):
+def do_with_retry(call, request, opts: tuple, retry_times: int, retry_policy=None):
     # To ensure the request is successfully received by the server,
     # it should be retried after a network exception occurs.
     # To prevent the retry from causing duplicate uploading same data,
     # the request should be retried by using the same requestId.
     # If a new requestId is used, it will be treated as a new request
-    # by the server, which may save duplicate data
+    # by the server, which may save duplicate data.
+    # With a retry_policy.RetryPolicy, retries back off with jitter, are bounded by its budget
+    # and max_retry_times (retry_times is ignored), and responses with code 429/410 are retried too.
+    if retry_policy is not None:
+        return retry_policy.execute(lambda: call(request, *opts))
     if retry_times < 0:
         retry_times = 0
     try_times = retry_times + 1
@@ -72,7 +79,7 @@ def is_empty_str(st: str) -> bool:
     return st is None or len(st) == 0
 
 
-def ping(project_id: str, http_cli: Session, ping_url_format: str,
+def ping(project_id: str, http_cli: Union[Session, Transport], ping_url_format: str,
          schema: str, host: str, ping_timeout_seconds: float) -> bool:
     url: str = ping_url_format.format(schema, host)
     req_id: str = "ping_" + str(uuid.uuid1())
@@ -101,12 +108,54 @@ def ping(project_id: str, http_cli: Session, ping_url_format: str,
         return False
 
 
+async def async_ping(project_id: str, http_cli, ping_url_format: str,
+                     schema: str, host: str, ping_timeout_seconds: float) -> bool:
+    # http_cli is an aiohttp.ClientSession, it is not imported here
+    # because aiohttp is an optional dependency.
+    url: str = ping_url_format.format(schema, host)
+    req_id: str = "ping_" + str(uuid.uuid1())
+    headers = {
+        "Request-Id": req_id,
+        "Project-Id": project_id,
+    }
+
+    async def do_get():
+        async with http_cli.get(url, headers=headers) as rsp:
+            return rsp.status, await rsp.read()
+
+    start = time.time()
+    try:
+        status_code, content = await asyncio.wait_for(do_get(), ping_timeout_seconds)
+        cost = int((time.time() - start) * 1000)
+        if _is_ping_rsp_success(status_code, content):
+            MetricsLog.info(req_id, "[ByteplusSDK] ping success, project_id:{}, host:{}, cost:{}ms",
+                            project_id, host, cost)
+            log.debug("[ByteplusSDK] ping success, host:'%s' cost:%dms", host, cost)
+            return True
+        MetricsLog.warn(req_id, "[ByteplusSDK] ping fail, project_id:{}, host:{}, cost:{}ms, status:{}",
+                        project_id, host, cost, status_code)
+        log.warning("[ByteplusSDK] ping fail, host:'%s', cost:%dms, status:'%s'", host, cost, status_code)
+        return False
+    except asyncio.CancelledError:
+        raise
+    except BaseException as e:
+        cost = int((time.time() - start) * 1000)
+        MetricsLog.warn(req_id, "[ByteplusSDK] ping find err, project_id:{}, host:{}, cost:{}ms, err:{}",
+                        project_id, host, cost, repr(e))
+        log.warning("[ByteplusSDK] ping find err, host:'%s', cost:%dms, err:'%r'", host, cost, e)
+        return False
+
+
 def is_ping_success(rsp: Response) -> bool:
-    if rsp.status_code != constant.HTTP_STATUS_OK:
+    return _is_ping_rsp_success(rsp.status_code, rsp.content)
+
+
+def _is_ping_rsp_success(status_code: int, content: Optional[bytes]) -> bool:
+    if status_code != constant.HTTP_STATUS_OK:
         return False
-    if rsp.content is None:
+    if content is None:
         return False
-    rsp_str: str = str(rsp.content)
+    rsp_str: str = str(content)
     return len(rsp_str) < 20 and "pong" in rsp_str
 
 
@@ -124,6 +173,66 @@ def escape_metrics_tag_value(value: str) -> str:
     return value
 
 
+class _LatencyWindow(object):
+    # Keeps the latest `size` latencies, written without a lock by request threads.
+    def __init__(self, size: int):
+        self.size: int = size
+        self.latencies: List[int] = []
+        self.index: int = 0
+
+    def put(self, cost_ms: int):
+        if len(self.latencies) < self.size:
+            self.latencies.append(cost_ms)
+            return
+        self.latencies[self.index] = cost_ms
+        self.index = (self.index + 1) % self.size
+
+    def percentile(self, percentile: float, min_samples: int) -> Optional[int]:
+        latencies = list(self.latencies)
+        if len(latencies) < min_samples:
+            return None
+        latencies.sort()
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile))]
+
+
+class _RatioBudget(object):
+    # A token bucket bounding an extra action (hedge, retry) to `ratio` of the requests:
+    # each request deposits `ratio` token and each action spends one.
+    def __init__(self, ratio: float, max_tokens: float):
+        self._ratio = ratio
+        self._max_tokens = max_tokens
+        self._tokens: float = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self._max_tokens, self._tokens + self._ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    # Retry-After is either delay seconds or an HTTP date
+    if value is None or len(value) == 0:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_time = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_time is None:
+        return None
+    return max(0.0, retry_time.timestamp() - time.time())
+
+
 class HTTPRequest(object):
     def __init__(self,
                  header: dict,
@@ -136,20 +245,9 @@ class HTTPRequest(object):
         self.req_bytes: bytes = req_bytes
 
 
-def time_schedule(call, time_interval_seconds: float):
-    stop = False
-
-    def time_run():
-        while True:
-            if stop:
-                return
-            call()
-            time.sleep(time_interval_seconds)
-
-    def cancel_func():
-        nonlocal stop
-        stop = True
-
-    thread = threading.Thread(target=time_run)
-    thread.start()
-    return cancel_func
+# Runs `call` at once and then every time_interval_seconds on the shared scheduler,
+# returns a function which cancels it.
+def time_schedule(call, time_interval_seconds: float, name: Optional[str] = None):
+    # imported here as scheduler imports metrics, which imports utils
+    from byteplus_rec_core import scheduler
+    return scheduler.default_scheduler().schedule(call, time_interval_seconds, name)
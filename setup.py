@@ -36,8 +36,11 @@ setup(
     url=about['__url__'],
     packages=find_packages(),
     include_package_data=True,
-    python_requires=">=3",
+    python_requires=">=3.7",
     install_requires=install_requires,
+    extras_require={
+        'async': ['aiohttp>=3.7'],
+    },
     license=about['__license__'],
     classifiers=[
         'Development Status :: 5 - Production/Stable',
@@ -46,8 +49,6 @@ setup(
         'License :: OSI Approved :: Apache Software License',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3.9',
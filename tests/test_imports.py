@@ -0,0 +1,24 @@
+import subprocess
+import sys
+import unittest
+
+# the modules which must be importable as the first import of a process
+_ENTRY_MODULES = [
+    "byteplus_rec_core.metrics.metrics",
+    "byteplus_rec_core.utils",
+    "byteplus_rec_core.scheduler",
+    "byteplus_rec_core.http_client",
+]
+
+
+class ImportTest(unittest.TestCase):
+    def test_import_in_fresh_interpreter(self):
+        for module in _ENTRY_MODULES:
+            with self.subTest(module=module):
+                result = subprocess.run([sys.executable, "-c", "import " + module],
+                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                self.assertEqual(0, result.returncode, result.stderr.decode("utf-8"))
+
+
+if __name__ == "__main__":
+    unittest.main()